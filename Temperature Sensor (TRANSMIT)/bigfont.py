@@ -0,0 +1,59 @@
+# Large 5x5 block font, pre-rendered once per (char, scale) and blitted.
+#
+# Each "#" cell is a scale x scale block on a (scale + 1) x (2 * scale)
+# grid, the same shape the old per-pixel draw_huge_digit() produced.
+
+import framebuf
+
+DIGITS = {
+    "0": ["#####", "#   #", "#   #", "#   #", "#####"],
+    "1": ["  #  ", " ##  ", "  #  ", "  #  ", "#####"],
+    "2": ["#####", "    #", "#####", "#    ", "#####"],
+    "3": ["#####", "    #", "#####", "    #", "#####"],
+    "4": ["#   #", "#   #", "#####", "    #", "    #"],
+    "5": ["#####", "#    ", "#####", "    #", "#####"],
+    "6": ["#####", "#    ", "#####", "#   #", "#####"],
+    "7": ["#####", "    #", "   # ", "  #  ", "  #  "],
+    "8": ["#####", "#   #", "#####", "#   #", "#####"],
+    "9": ["#####", "#   #", "#####", "    #", "#####"],
+    ".": ["     ", "     ", "     ", "     ", "  #  "],
+    "-": ["     ", "     ", "#####", "     ", "     "],
+    "F": ["#####", "#    ", "#### ", "#    ", "#    "],
+    "C": ["#####", "#    ", "#    ", "#    ", "#####"],
+}
+
+_cache = {}
+
+
+def glyph_size(scale):
+    return 5 * scale + 4, 9 * scale
+
+
+def advance(scale):
+    return 8 * scale
+
+
+def glyph(char, scale=3):
+    key = (char, scale)
+    fb = _cache.get(key)
+    if fb is None:
+        w, h = glyph_size(scale)
+        fb = framebuf.FrameBuffer(bytearray(w * ((h + 7) // 8)), w, h,
+                                  framebuf.MONO_VLSB)
+        pattern = DIGITS.get(char)
+        if pattern:
+            for row in range(5):
+                for col in range(5):
+                    if pattern[row][col] == "#":
+                        fb.fill_rect(col * (scale + 1), row * 2 * scale,
+                                     scale, scale, 1)
+        _cache[key] = fb
+    return fb
+
+
+def draw_huge_text(fb, text, x, y, scale=3):
+    step = advance(scale)
+    for char in text:
+        if char != " ":
+            fb.blit(glyph(char, scale), x, y, 0)  # key 0: only set pixels
+        x += step
@@ -22,9 +22,11 @@ class DS18X20:
     def powermode(self, powerpin=None):
         if self.powerpin is not None: # deassert strong pull-up
             self.powerpin(PULLUP_OFF)
-        self.ow.writebyte(self.ow.CMD_SKIPROM)
-        self.ow.writebyte(CMD_RDPOWER)
-        self.power = self.ow.readbit()
+        # Any parasite-powered probe answers 0; no answer counts as parasite
+        if self.ow.transact(None, CMD_RDPOWER):
+            self.power = self.ow.readbit()
+        else:
+            self.power = 0
         if powerpin is not None:
             assert type(powerpin) is Pin, "Parameter must be a Pin object"
             self.powerpin = powerpin
@@ -36,33 +38,28 @@ class DS18X20:
             self.powerpin(PULLUP_OFF)
         return [rom for rom in self.ow.scan() if rom[0] in (0x10, 0x22, 0x28)]
 
+    def alarm_search(self):
+        # Probes whose last conversion was >= TH or <= TL
+        if self.powerpin is not None: # deassert strong pull-up
+            self.powerpin(PULLUP_OFF)
+        return [rom for rom in self.ow.scan(self.ow.CMD_ALARMSEARCH) if rom[0] in (0x10, 0x22, 0x28)]
+
     def convert_temp(self, rom=None):
         if self.powerpin is not None: # deassert strong pull-up
             self.powerpin(PULLUP_OFF)
-        self.ow.reset()
-        if rom is None:
-            self.ow.writebyte(self.ow.CMD_SKIPROM)
-        else:
-            self.ow.select_rom(rom)
-        self.ow.writebyte(CMD_CONVERT, self.powerpin)
+        self.ow.transact(rom, CMD_CONVERT, powerpin=self.powerpin)
 
     def read_scratch(self, rom):
         if self.powerpin is not None: # deassert strong pull-up
             self.powerpin(PULLUP_OFF)
-        self.ow.reset()
-        self.ow.select_rom(rom)
-        self.ow.writebyte(CMD_RDSCRATCH)
-        self.ow.readinto(self.buf)
-        assert self.ow.crc8(self.buf) == 0, 'CRC error'
+        ok = self.ow.transact(rom, CMD_RDSCRATCH, into=self.buf)
+        assert ok and self.ow.crc8(self.buf) == 0, 'CRC error'
         return self.buf
 
     def write_scratch(self, rom, buf):
         if self.powerpin is not None: # deassert strong pull-up
             self.powerpin(PULLUP_OFF)
-        self.ow.reset()
-        self.ow.select_rom(rom)
-        self.ow.writebyte(CMD_WRSCRATCH)
-        self.ow.write(buf)
+        self.ow.transact(rom, CMD_WRSCRATCH, buf)
 
     def read_temp(self, rom):
         try:
@@ -84,6 +81,25 @@ class DS18X20:
         except AssertionError:
             return None
 
+    def read_raw(self, rom):
+        # Like read_temp(), in integer sixteenths of a degree C
+        try:
+            buf = self.read_scratch(rom)
+            if rom[0] == 0x10:
+                t = buf[0] >> 1
+                if buf[1]:
+                    t -= 128
+                return (t << 4) - 4 + (buf[7] - buf[6]) * 16 // buf[7]
+            elif rom[0] in (0x22, 0x28):
+                t = buf[1] << 8 | buf[0]
+                if t & 0x8000: # sign bit set
+                    t -= 0x10000
+                return t
+            else:
+                return None
+        except AssertionError:
+            return None
+
     def resolution(self, rom, bits=None):
         if bits is not None and 9 <= bits <= 12:
             self.config[2] = ((bits - 9) << 5) | 0x1f
@@ -0,0 +1,50 @@
+# Latest-value mailbox between the sensor's tasks.
+#
+# The sampling task posts every reading; each consumer remembers the
+# sequence number it last handled and waits for a newer one. Only the
+# newest reading is kept, so a consumer that falls behind (the display)
+# skips straight to it instead of working through a backlog, and never
+# holds up the others. The mailbox is created once and its fields are
+# overwritten in place.
+#
+# Sequence numbers run from 1 to SEQ_MAX and wrap back to 1, so they stay
+# small ints; 0 means no reading yet. skipped() counts across the wrap.
+
+import uasyncio as asyncio
+from micropython import const
+
+SEQ_MAX = const(0x3fffffff)
+
+
+class Mailbox:
+    def __init__(self):
+        self.seq = 0  # bumped by every post(), 0 until the first reading
+        self.temp = None  # hottest probe, centi-degrees F
+        self.temps = None  # the sampler's per-probe list, raw 1/16 C
+        self.threshold = 0  # knob setting, centi-degrees F
+        self.trip_at = 0  # level to trip at, centi-degrees F, may be below threshold
+        self.ms = 0  # ticks_ms when the reading was taken
+        self.event = asyncio.Event()
+
+    def post(self, temp, temps, threshold, trip_at, ms):
+        self.temp = temp
+        self.temps = temps
+        self.threshold = threshold
+        self.trip_at = trip_at
+        self.ms = ms
+        self.seq = self.seq % SEQ_MAX + 1
+        self.event.set()
+
+    async def wait(self, seen):
+        # Sequence number of the newest reading after seen; returns at once
+        # if one was posted while the caller was busy
+        while self.seq == seen:
+            self.event.clear()
+            await self.event.wait()
+        return self.seq
+
+    def skipped(self, seen):
+        # Readings posted after seen and before the current one
+        if not seen or not self.seq:
+            return 0
+        return (self.seq - seen - 1) % SEQ_MAX
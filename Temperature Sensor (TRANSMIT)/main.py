@@ -6,39 +6,93 @@ import bluetooth
 import struct
 import ds18x20
 from onewire import OneWire
+from onewire_uart import OneWireUART
+from sampler import Sampler
+from scheduler import Scheduler
+from mailbox import Mailbox
+from romcache import RomRegistry
 from machine import ADC, Pin
 from ssd1306 import SSD1306_I2C
+from bigfont import draw_huge_text
+from telemetry import FrameBuilder, Advert, centi_f
+import stats
+import connparams  # logs connection parameter updates
+from stats import log, ERROR, WARN, INFO, DEBUG
+
+# Startup order: BLE comes up first, then the first sample; the display and
+# the 1-Wire probe check wait until the tasks are running
+p_import = stats.Phase("boot_import")  # modules loaded
+p_import.hit()
 
 # BLE Configuration
 BLE_DEVICE_NAME = "TempMon"
 SERVICE_UUID = bluetooth.UUID("af65f22f-0b5c-4ac5-a2a1-76606258c2b0")
 CHARACTERISTIC_UUID = bluetooth.UUID("19b10001-e8f2-537e-4f6c-d104768a1214")
-
-# Digit drawing functions
-DIGITS = {
-    "0": ["#####", "#   #", "#   #", "#   #", "#####"],
-    "1": ["  #  ", " ##  ", "  #  ", "  #  ", "#####"],
-    "2": ["#####", "    #", "#####", "#    ", "#####"],
-    "3": ["#####", "    #", "#####", "    #", "#####"],
-    "4": ["#   #", "#   #", "#####", "    #", "    #"],
-    "5": ["#####", "#    ", "#####", "    #", "#####"],
-    "6": ["#####", "#    ", "#####", "#   #", "#####"],
-    "7": ["#####", "    #", "   # ", "  #  ", "  #  "],
-    "8": ["#####", "#   #", "#####", "#   #", "#####"],
-    "9": ["#####", "#   #", "#####", "    #", "#####"],
-    ".": ["     ", "     ", "     ", "     ", "  #  "]
-}
+STATS_UUID = bluetooth.UUID("19b10002-e8f2-537e-4f6c-d104768a1214")
+TRANSPORT = "gatt"  # "gatt" notifies a connected central, "broadcast" advertises readings
+BROADCAST_INTERVAL_US = 100_000  # advertising interval in broadcast mode
+ADV_FAST_US = 30_000  # connectable advertising near the threshold, so a dropped link is back fast
+ADV_SLOW_US = 250_000  # and while the water is cool
+ADV_FAST_MARGIN = 3000  # centi-F below the threshold
+ADV_RECHECK_MS = 5000  # slow advertising restarts this often to pick up a rise
+BLE_MTU = 247  # largest MTU we accept, the central asks for it
+BLE_MTU_DEFAULT = 23  # ATT MTU before a central exchanges, and with none connected
+TELEMETRY_BATCH = 4  # samples per probe per notification (sent early on a trip)
+FRAME_MAX_MS = 1000  # no sample is held back longer, the receiver's staleness deadline counts on it
+LEGACY_FRAMES = False  # send the original 8-byte "<ff" frame every sample
 
 # Constants Setup
-THRESHOLD_MIN = 104.0
-THRESHOLD_MAX = 120.0
-threshold = THRESHOLD_MIN
+THRESHOLD_MIN = 104  # whole degrees F
+THRESHOLD_MAX = 120
+threshold = THRESHOLD_MIN * 100  # centi-degrees F, like every temperature below
 OBSERVED_MIN = 180
 OBSERVED_MAX = 3200
+UNIT = "F"  # "F" or "C", display only: the knob, frames and threshold stay in F
+RESOLUTION = 9  # DS18B20 bits, 9-bit converts in ~94 ms
+ONEWIRE_UART = None  # UART id to run the 1-Wire bus through, None bit-bangs it
+RESCAN_MS = 30_000  # background bus re-enumeration period
+ONEWIRE_TX_PIN = 3  # UART TX, joined to the data line (pin 2) through a diode
+LOG_LEVEL = stats.ERROR  # console output, stats.DEBUG shows every reading
+STATS_MS = 5000  # stats characteristic refresh period
+ALARM_MODE = False  # program the threshold into the probes' TH and read only probes in alarm
+ALARM_REFRESH_MS = 5000  # alarm mode: probes below the threshold are only read this often
+ADAPTIVE = True  # resolution and sample interval follow the margin to the threshold
+PREDICT_MS = 0  # trip early when the extrapolated crossing is this close, 0 = off
+DISPLAY_FPS = 10  # OLED redraw cap, readings in between are skipped
+DISPLAY_RETRY_MS = 5000  # wait after an I2C error before setting the panel up again
+KNOB_MS = 100  # threshold knob polling period
+I2C_FREQ = 400_000  # OLED bus clock, fast mode; 1_000_000 (fast mode plus) if the panel and wiring take it
+GC_BUDGET = 8_000  # collect at an idle point once this much was allocated
+GC_THRESHOLD = 32_000  # automatic collection backstop, bytes
+
+stats.level = LOG_LEVEL
+stats.threshold(GC_THRESHOLD)
+t_read = stats.Timer("read")
+t_draw = stats.Timer("draw")
+t_show = stats.Timer("show")  # OLED frame, first page to last, yields included
+t_show_bus = stats.Timer("show_bus")  # the same frame's bus time alone
+t_show_page = stats.Timer("show_page")  # its longest page transfer, the longest the display blocks the loop
+t_show_bytes = stats.Timer("show_bytes", "B")  # the same frame's I2C traffic, commands included
+t_notify = stats.Timer("notify")
+n_sent = stats.Counter("sent")
+n_send_fail = stats.Counter("send_fail")
+n_read_fail = stats.Counter("read_fail")
+n_skipped = stats.Counter("frames_skipped")
+n_display_fail = stats.Counter("display_fail")  # I2C errors, panel missing or bus flaky
+n_probe_reads = stats.Counter("probe_reads")  # scratchpad reads, fewer than probes x samples in alarm mode
+n_searches = stats.Counter("alarm_searches")
+n_overflow = stats.Counter("probes_dropped")  # readings left out of frames too small for every probe
+a_cycle = stats.Alloc("alloc_cycle")  # heap bytes per sample cycle, all tasks
+a_publish = stats.Alloc("alloc_publish")  # heap bytes per reading published
+p_ble = stats.Phase("boot_ble")  # services registered
+p_advertise = stats.Phase("boot_advertise")  # advertising started
+p_sample = stats.Phase("boot_sample")  # first reading taken
+p_notify = stats.Phase("boot_notify")  # first reading sent to a connected central, or broadcast
+p_display = stats.Phase("boot_display")  # OLED initialised and drawn
 
 # Hardware Setup
-i2c = machine.I2C(0, scl=machine.Pin(5), sda=machine.Pin(4), freq=100000)
-oled = SSD1306_I2C(128, 64, i2c)
+i2c = machine.I2C(0, scl=machine.Pin(5), sda=machine.Pin(4), freq=I2C_FREQ)
+oled = None  # set up by display() once the first reading is out
 temp_pin = machine.Pin(2)
 knob = ADC(Pin(1))
 red_led = machine.Pin(11, machine.Pin.OUT)
@@ -48,12 +102,12 @@ green_led = machine.Pin(9, machine.Pin.OUT)
 knob.atten(ADC.ATTN_11DB)  # Full 0-3.3V range
 
 # DS18B20 Initialization
-ow = OneWire(temp_pin)
+if ONEWIRE_UART is None:
+    ow = OneWire(temp_pin)
+else:
+    ow = OneWireUART(machine.UART(ONEWIRE_UART, tx=ONEWIRE_TX_PIN, rx=temp_pin))
 ds = ds18x20.DS18X20(ow)
-roms = ds.scan()
-if not roms:
-    print("No DS18B20 sensors found!")
-    raise SystemExit
+registry = RomRegistry(ds)  # probes are looked up by sense()
 
 # BLE Service Setup
 temp_service = aioble.Service(SERVICE_UUID)
@@ -64,121 +118,277 @@ temp_characteristic = aioble.Characteristic(
     notify=True,
     capture=False
 )
+# Added after the temperature characteristic so its handles don't move
+stats_characteristic = aioble.Characteristic(temp_service, STATS_UUID, read=True)
 aioble.register_services(temp_service)
+aioble.config(mtu=BLE_MTU)
+p_ble.hit()
+link = None  # current central connection, for its negotiated MTU
+linked_at = 0  # ticks_ms it connected
 
-# Resolution Configuration
-def set_resolution(rom, res_bits):
-    assert res_bits in (9, 10, 11, 12)
-    config = {9: 0x1F, 10: 0x3F, 11: 0x5F, 12: 0x7F}[res_bits]
-    ow.reset()
-    ow.select_rom(rom)
-    ow.writebyte(0x4E)  # Write scratchpad
-    ow.writebyte(0x4B)  # TH register
-    ow.writebyte(0x46)  # TL register
-    ow.writebyte(config)  # Configuration register
-
-for rom in roms:
-    set_resolution(rom, 9)
+# The resolution is written with TH and TL on the first sample, and to
+# every probe added later
+sampler = Sampler(ds, [], RESOLUTION, poll=True, alarm=ALARM_MODE,
+                  refresh_ms=ALARM_REFRESH_MS, reads=n_probe_reads, searches=n_searches)
+scheduler = Scheduler(predict_ms=PREDICT_MS)
+latest = Mailbox()  # newest reading, from sense() to publish() and display()
     
 # Arduino-style map function for MicroPython
 def map_value(x, in_min, in_max, out_min, out_max):
     return (x - in_min) * (out_max - out_min) // (in_max - in_min) + out_min
 
-# Convert from C to F
-def c_to_f(temp):
-    return temp * 1.8 + 32
-
-
-
-# Temperature reading
-async def read_temp():
-    ds.convert_temp()
-    await asyncio.sleep_ms(750)
-    return ds.read_temp(roms[0])
-
-def draw_huge_digit(oled, char, x, y):
-    pattern = DIGITS.get(char, [" "]*5)
-    for row in range(5):
-        for col in range(5):
-            if pattern[row][col] == "#":
-                for dx in range(3):
-                    for dy in range(3):
-                        oled.pixel(x + col*4 + dx, y + row*6 + dy, 1)
-
-def draw_huge_text(oled, text, x, y):
-    for i, char in enumerate(text):
-        draw_huge_digit(oled, char, x + i*24, y)
 
 # BLE Advertising
 async def ble_advertise():
+    global link, linked_at
     while True:
+        # Fast until the first reading, then by the margin to the threshold
+        fast = latest.seq == 0 or threshold - latest.temp < ADV_FAST_MARGIN
         try:
+            p_advertise.hit()
             # Add manufacturer data to force full UUID advertisement
             async with await aioble.advertise(
-                250_000,
+                ADV_FAST_US if fast else ADV_SLOW_US,
                 name=BLE_DEVICE_NAME,
                 services=[SERVICE_UUID],
                 manufacturer=(0xFFFF, b'\x00'),  # Forces 128-bit UUID inclusion
                 appearance=0,
+                timeout_ms=None if fast else ADV_RECHECK_MS,
             ) as connection:
-                print("Client connected:", connection.device)
+                link = connection
+                linked_at = time.ticks_ms()
+                log(INFO, "Client connected:", connection.device)
                 await connection.disconnected()
-                print("Client disconnected")
+                link = None
+                # Frames go back to the default size for the next central
+                frames.flush()
+                frames.max_len = BLE_MTU_DEFAULT - 3
+                log(INFO, "Client disconnected")
+        except asyncio.TimeoutError:
+            pass
         except Exception as e:
-            print("Advertising error:", e)
+            log(ERROR, "Advertising error:", e)
             await asyncio.sleep_ms(1000)
 
-# Main temperature update loop
-async def update_display():
-    last_temp = None
-    global threshold     # in F
+def notify(payload):
+    t_notify.start()
+    try:
+        temp_characteristic.write(payload, send_update=True)
+        n_sent.inc()
+        if link is not None:
+            p_notify.hit()
+        if stats.level >= DEBUG:
+            log(DEBUG, "Sent:", len(payload), "bytes")
+    except Exception as e:
+        n_send_fail.inc()
+        log(ERROR, "BLE write failed:", e)
+    t_notify.stop()
+
+frames = FrameBuilder(notify, max_len=BLE_MTU_DEFAULT - 3, max_samples=TELEMETRY_BATCH,
+                      max_age_ms=FRAME_MAX_MS, overflow=n_overflow)
+temps_f = []  # per-probe readings in centi-F for the frame builder, reused
+legacy = bytearray(8)  # legacy "<ff" payload, packed in place
+advert = Advert(BLE_DEVICE_NAME)
+broadcast_seq = 0
+
+# Connectionless mode: the latest reading rides in the advertising data
+def broadcast(temp, threshold):
+    global broadcast_seq
+    broadcast_seq = (broadcast_seq + 1) & 0xff
+    payload = advert.fill(broadcast_seq, temp, threshold)
+    try:
+        bluetooth.BLE().gap_advertise(BROADCAST_INTERVAL_US, adv_data=payload, connectable=False)
+        p_advertise.hit()
+        p_notify.hit()
+    except Exception as e:
+        n_send_fail.inc()
+        log(ERROR, "Broadcast failed:", e)
+
+# Sampling task: convert, read, pick the next interval, post the reading
+async def sense():
+    # Known probes are confirmed from the ROM file, a full search only runs
+    # on the first boot; advertising is already up by now
+    sampler.set_roms(registry.startup())
+    if not sampler.roms:
+        log(ERROR, "No DS18B20 sensors found!")
+    while True:
+        a_cycle.mark()
+        start = time.ticks_ms()
+        t_read.start()
+        await sampler.sample()
+        temp = sampler.hottest()
+        t_read.stop()
+        if temp is None:
+            n_read_fail.inc()
+            log(WARN, "Sensor read failed")
+            await asyncio.sleep_ms(500)
+            continue
+        temp = centi_f(temp)
+
+        # Next resolution and interval, and the level to trip at: a
+        # predicted crossing is sent as a trip level at the current reading
+        scheduler.update(temp, threshold, start)
+        if ADAPTIVE:
+            interval = scheduler.interval
+            if scheduler.bits != sampler.res_bits:
+                log(INFO, "Sampling:", scheduler.bits, "bit every", interval, "ms")
+            sampler.set_resolution(scheduler.bits)
+        else:
+            interval = 0
+        trip_at = min(threshold, temp) if scheduler.early_trip() else threshold
+        latest.post(temp, sampler.temps, threshold, trip_at, start)
+        p_sample.hit()
+
+        # Sleeping, even for 0 ms, lets the publisher run on this reading
+        left = interval - time.ticks_diff(time.ticks_ms(), start)
+        await asyncio.sleep_ms(left if left > 0 else 0)
+
+# Threshold from the potentiometer
+async def read_knob():
+    global threshold     # in centi-F
     while True:
-        temp = await read_temp()
-        temp = c_to_f(temp)
-        
-        # Update threshold from potentiometer
         raw_value = knob.read()
-        new_threshold = map_value(raw_value, OBSERVED_MIN, OBSERVED_MAX, THRESHOLD_MIN, THRESHOLD_MAX)
-        if new_threshold != threshold:
-            threshold = new_threshold
-        
+        threshold = map_value(raw_value, OBSERVED_MIN, OBSERVED_MAX, THRESHOLD_MIN, THRESHOLD_MAX) * 100
+        # TH compares whole degrees C, so round down: a probe may alarm up
+        # to 1 C early, and is then read and compared exactly
+        sampler.set_alarm((threshold - 3200) * 5 // 900)
+        await asyncio.sleep_ms(KNOB_MS)
+
+# Safety path: LEDs and the BLE message for every reading, as soon as it's posted
+async def publish():
+    seen = 0
+    while True:
+        seen = await latest.wait(seen)
+        a_publish.start()
+        temp = latest.temp
+        trip_at = latest.trip_at
+
         # Update LEDs
-        if temp >= threshold:
+        if temp >= trip_at:
             red_led.on()
             green_led.off()
         else:
             red_led.off()
             green_led.on()
-        
-        # Update display
-        oled.fill(0)
-        # Draw temperature in large digits
-        draw_huge_text(oled, f"{int(temp)}", 0, 20)
-        # Draw threshold in top right corner, small font
-        oled.text(f"THR:{int(threshold)}", 60, 0, 1)
-        oled.show()
-        last_temp = temp
-        
-        
+
         # BLE message
-        payload = struct.pack("<ff", temp, threshold)  # Little-endian, 8 bytes total
+        if TRANSPORT == "broadcast":
+            broadcast(temp, trip_at)
+        elif LEGACY_FRAMES:
+            struct.pack_into("<ff", legacy, 0, temp / 100, trip_at / 100)  # Little-endian, 8 bytes total
+            notify(legacy)
+        else:
+            if link is not None and link.mtu:
+                frames.max_len = link.mtu - 3
+            temps = latest.temps
+            if len(temps_f) != len(temps):
+                temps_f[:] = temps  # probe count changed
+            for i in range(len(temps)):
+                temps_f[i] = centi_f(temps[i])
+            frames.add(temps_f, trip_at, latest.ms)
+            # Unbatched until a central has been connected for FRAME_MAX_MS,
+            # so its first reading doesn't wait for a batch to fill
+            if link is None or time.ticks_diff(latest.ms, linked_at) < FRAME_MAX_MS:
+                frames.flush()
+        a_publish.stop()
+
+def degrees(centi_f):
+    # Whole degrees in UNIT, for the display
+    if UNIT == "C":
+        return (centi_f - 3200) * 5 // 900
+    return centi_f // 100
+
+# OLED, at most DISPLAY_FPS frames a second and always the newest reading
+# The text is only formatted, drawn and sent when the whole degrees shown
+# change, so a steady reading costs neither allocations nor I2C time.
+# Frames go out a page at a time, yielding in between. The panel is
+# initialised here, after the first reading went out. An I2C error is
+# logged and the panel set up again DISPLAY_RETRY_MS later; it never
+# reaches the sampling and publishing tasks.
+async def display():
+    global oled
+    seen = 0
+    frame_ms = 1000 // DISPLAY_FPS
+    shown_temp = None
+    shown_thr = None
+    while True:
+        await latest.wait(seen)
+        # Let a publisher woken by the same post go first
+        await asyncio.sleep_ms(0)
+        # Readings that came in since the last frame, up to the one about
+        # to be drawn, are never drawn
+        n_skipped.inc(latest.skipped(seen))
+        seen = latest.seq
+        start = time.ticks_ms()
+        temp = degrees(latest.temp)
+        thr = degrees(latest.threshold)
         try:
-            temp_characteristic.write(payload, send_update=True)
-            print(f"Sent: {temp}°F, {threshold}°F")
-        except Exception as e:
-            print("BLE write failed:", e)
+            if oled is None:
+                oled = SSD1306_I2C(128, 64, i2c, clear=False)  # the first frame is sent whole
+            if temp != shown_temp or thr != shown_thr:
+                t_draw.start()
+                oled.fill(0)
+                # Draw temperature in large digits
+                draw_huge_text(oled, f"{temp}{UNIT}", 0, 20)
+                # Draw threshold in top right corner, small font
+                oled.text(f"THR:{thr}", 60, 0, 1)
+                t_draw.stop()
+                t_show.start()
+                # Only the changed page spans go out, after the first frame
+                await oled.show_async(partial=shown_temp is not None)
+                t_show.stop()
+                t_show_bus.add(oled.frame_us)
+                t_show_page.add(oled.page_us)
+                t_show_bytes.add(oled.frame_bytes)
+                shown_temp = temp
+                shown_thr = thr
+                p_display.hit()
+        except OSError as e:
+            n_display_fail.inc()
+            log(ERROR, "Display error:", e)
+            oled = None
+            shown_temp = None
+            await asyncio.sleep_ms(DISPLAY_RETRY_MS)
+            continue
+        # Mid-conversion, with the reading already sent: a good time for it
+        stats.collect(GC_BUDGET)
+        left = frame_ms - time.ticks_diff(time.ticks_ms(), start)
+        if left > 0:
+            await asyncio.sleep_ms(left)
 
+# Pick up hot-plugged probes and drop dead ones
+async def watch_bus():
+    while True:
+        await asyncio.sleep_ms(RESCAN_MS)
+        async with sampler.lock:  # don't search mid-conversion
+            added, removed = await registry.rescan()
+        if added or removed:
+            log(INFO, "Probes: +", len(added), "-", len(removed))
+            sampler.set_roms(registry.roms)
 
-        
+# Keep the read-only stats characteristic current
+async def publish_stats():
+    while True:
+        stats_characteristic.write(stats.pack())
+        await asyncio.sleep_ms(STATS_MS)
 
 # Main async loop
 async def main():
-    advert_task = asyncio.create_task(ble_advertise())
-    display_task = asyncio.create_task(update_display())
-    await asyncio.gather(advert_task, display_task)
+    # Advertising starts first, then the knob is read before the first
+    # sample; publish() waits on the mailbox before display() so it's
+    # woken first
+    tasks = []
+    if TRANSPORT == "gatt":
+        tasks.append(asyncio.create_task(ble_advertise()))
+    tasks += [asyncio.create_task(read_knob()), asyncio.create_task(sense()),
+              asyncio.create_task(publish()), asyncio.create_task(display()),
+              asyncio.create_task(watch_bus()),
+              asyncio.create_task(publish_stats())]
+    asyncio.create_task(stats.console())  # not gathered, a console error can't end the others
+    await asyncio.gather(*tasks)
 
 try:
     asyncio.run(main())
 except KeyboardInterrupt:
-    print("Shutting down")
+    log(WARN, "Shutting down")
     machine.reset()
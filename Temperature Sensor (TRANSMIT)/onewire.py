@@ -11,11 +11,38 @@ OneWire library for MicroPython
 import time
 import machine
 
+def _crc_table():
+    # Dallas/Maxim CRC8 (x^8 + x^5 + x^4 + 1, reflected) of every byte value
+    tab = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8c if crc & 1 else crc >> 1
+        tab[i] = crc
+    return bytes(tab)
+
+CRC_TABLE = _crc_table()
+
+def _crc8_py(tab, data, n):
+    crc = 0
+    for i in range(n):
+        crc = tab[crc ^ data[i]]
+    return crc
+
+# SyntaxError: no viper emitter in this firmware; ValueError: a .mpy
+# built for another arch; NameError: no ptr8, i.e. not MicroPython
+try:
+    from onewire_crc import crc8 as _crc8
+    _crc8(CRC_TABLE, b"\x00", 1)
+except (ImportError, SyntaxError, ValueError, NameError):
+    _crc8 = _crc8_py
+
 class OneWire:
     CMD_SEARCHROM = 0xf0
     CMD_READROM = 0x33
     CMD_MATCHROM = 0x55
     CMD_SKIPROM = 0xcc
+    CMD_ALARMSEARCH = 0xec
     PULLUP_ON = 1
 
     def __init__(self, pin):
@@ -23,10 +50,14 @@ class OneWire:
         self.pin.init(pin.OPEN_DRAIN, pin.PULL_UP)
         self.disable_irq = machine.disable_irq
         self.enable_irq = machine.enable_irq
-        self.crctab1 = (b"\x00\x5E\xBC\xE2\x61\x3F\xDD\x83"
-                        b"\xC2\x9C\x7E\x20\xA3\xFD\x1F\x41")
-        self.crctab2 = (b"\x00\x9D\x23\xBE\x46\xDB\x65\xF8"
-                        b"\x8C\x11\xAF\x32\xCA\x57\xE9\x74")
+        self._headers()
+
+    def _headers(self):
+        # ROM command, ROM and function command of a transaction, with
+        # views for each shape so transact() doesn't allocate them
+        self.hdr = bytearray(10)
+        mv = memoryview(self.hdr)
+        self.hdr_views = (mv[:1], mv[:2], mv[:9], mv[:10])
 
 
     def reset(self, required=False):
@@ -64,9 +95,21 @@ class OneWire:
         return value
 
     def readbyte(self):
+        # Eight read slots in one IRQ-off section. Like readbit(), the slot
+        # timing counts on the interpreter's own overhead for the low
+        # pulse and the sample point, so this must stay bytecode.
+        sleep_us = time.sleep_us
+        pin = self.pin
         value = 0
-        for i in range(8):
-            value |= self.readbit() << i
+        pin(1)
+        i = self.disable_irq()
+        for b in range(8):
+            pin(0)
+            pin(1)
+            sleep_us(5)
+            value |= pin() << b
+            sleep_us(40)
+        self.enable_irq(i)
         return value
 
     def readbytes(self, count):
@@ -96,10 +139,19 @@ class OneWire:
         self.enable_irq(i)
 
     def writebyte(self, value, powerpin=None):
-        for i in range(7):
-            self.writebit(value & 1)
+        # Eight write slots in one IRQ-off section, bytecode like readbyte()
+        sleep_us = time.sleep_us
+        pin = self.pin
+        i = self.disable_irq()
+        for b in range(8):
+            pin(0)
+            pin(value & 1)
+            sleep_us(60)
+            pin(1)
             value >>= 1
-        self.writebit(value & 1, powerpin)
+        if powerpin:
+            powerpin(self.PULLUP_ON)
+        self.enable_irq(i)
 
     def write(self, buf):
         for b in buf:
@@ -113,37 +165,68 @@ class OneWire:
         self.writebyte(self.CMD_MATCHROM)
         self.write(rom)
 
+    def transact(self, rom, cmd, write_buf=None, read_len=0, powerpin=None, into=None):
+        """
+        One complete transaction: a single reset, MATCH_ROM rom (SKIP_ROM if
+        rom is None), cmd, then write_buf, then read read_len bytes (or
+        len(into) bytes into the given buffer). powerpin is switched on
+        after the last byte written, for parasite-powered converts.
+        Returns the bytes read, True if there was nothing to read, or None
+        if no device answered the reset.
+        """
+        if not self.reset():
+            return None
+        hdr = self.hdr
+        if rom is None:
+            hdr[0] = self.CMD_SKIPROM
+            n, v = 1, 0
+        else:
+            hdr[0] = self.CMD_MATCHROM
+            hdr[1:9] = rom
+            n, v = 9, 2
+        views = self.hdr_views
+        if powerpin and not write_buf:
+            self.write(views[v])
+            self.writebyte(cmd, powerpin)
+        else:
+            hdr[n] = cmd
+            self.write(views[v + 1])
+            if write_buf:
+                self.write(write_buf)
+        if into is None:
+            if not read_len:
+                return True
+            into = bytearray(read_len)
+        self.readinto(into)
+        return into
+
     def crc8(self, data):
         """
-        Compute CRC, based on tables
+        Compute CRC, based on a 256 entry table
         """
-        crc = 0
-        for i in range(len(data)):
-           crc ^= data[i] ## just re-using crc as intermediate
-           crc = (self.crctab1[crc & 0x0f] ^
-                  self.crctab2[(crc >> 4) & 0x0f])
-        return crc
-
-    def scan(self):
+        return _crc8(CRC_TABLE, data, len(data))
+
+    def scan(self, cmd=CMD_SEARCHROM):
         """
-        Return a list of ROMs for all attached devices.
+        Return a list of ROMs for all attached devices, or with
+        cmd=CMD_ALARMSEARCH only for those with their alarm flag set.
         Each ROM is returned as a bytes object of 8 bytes.
         """
         devices = []
         diff = 65
         rom = False
         for i in range(0xff):
-            rom, diff = self._search_rom(rom, diff)
+            rom, diff = self._search_rom(rom, diff, cmd)
             if rom:
                 devices += [rom]
             if diff == 0:
                 break
         return devices
 
-    def _search_rom(self, l_rom, diff):
+    def _search_rom(self, l_rom, diff, cmd=CMD_SEARCHROM):
         if not self.reset():
             return None, 0
-        self.writebyte(self.CMD_SEARCHROM)
+        self.writebyte(cmd)
         if not l_rom:
             l_rom = bytearray(8)
         rom = bytearray(8)
@@ -0,0 +1,17 @@
+# Table-driven 1-Wire CRC8 under the viper emitter.
+#
+# Kept apart from onewire.py: firmware built without the native emitters
+# rejects @micropython.viper while compiling the module, so onewire imports
+# this one under try/except and falls back to its plain Python loop.
+
+import micropython
+
+
+@micropython.viper
+def crc8(tab, data, n: int) -> int:
+    t = ptr8(tab)
+    buf = ptr8(data)
+    crc = 0
+    for i in range(n):
+        crc = t[crc ^ buf[i]]
+    return crc
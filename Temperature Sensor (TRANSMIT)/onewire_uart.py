@@ -0,0 +1,116 @@
+"""
+UART driven 1-Wire backend for MicroPython
+
+Wire TX through a diode (or an open-drain buffer) to the 1-Wire line and
+RX straight to it. A reset is one 0xF0 byte at 9600 baud, every time slot
+is one byte at 115200 baud: 0xFF is a write-1/read slot, 0x00 a write-0
+slot, and the echoed byte tells what the bus actually carried. Whole bytes
+and buffers go out in a single UART transfer, so the bit timing is done by
+the UART hardware and IRQs stay enabled.
+"""
+
+from onewire import OneWire
+
+RESET_BAUD = 9600
+SLOT_BAUD = 115200
+
+
+class OneWireUART(OneWire):
+    def __init__(self, uart, timeout=10):
+        self.uart = uart
+        self.timeout = timeout
+        self.baud = 0
+        self.slots = bytearray(64)  # 8 data bytes per transfer
+        self.mv = memoryview(self.slots)
+        self._headers()
+
+    def _baudrate(self, baud):
+        if baud != self.baud:
+            self.uart.init(baudrate=baud, bits=8, parity=None, stop=1,
+                           timeout=self.timeout)
+            self.baud = baud
+
+    def _xfer(self, n):
+        uart = self.uart
+        mv = self.mv[:n]
+        if uart.any():  # drop anything left over from an aborted transfer
+            uart.read()
+        uart.write(mv)
+        return uart.readinto(mv) == n
+
+    def _fill(self, buf, start, n):
+        # Expand n data bytes into 8n slot bytes, LSB first
+        slots = self.slots
+        j = 0
+        for i in range(start, start + n):
+            value = buf[i]
+            for bit in range(8):
+                slots[j] = 0xff if value & 1 else 0x00
+                value >>= 1
+                j += 1
+
+    def _collect(self, buf, start, n):
+        # A device pulling the line low clears the first echoed data bit
+        slots = self.slots
+        j = 0
+        for i in range(start, start + n):
+            value = 0
+            for bit in range(8):
+                value |= (slots[j] & 1) << bit
+                j += 1
+            buf[i] = value
+
+    def reset(self, required=False):
+        """
+        Perform the onewire reset function.
+        Returns True if a device asserted a presence pulse, False otherwise.
+        """
+        self._baudrate(RESET_BAUD)
+        self.slots[0] = 0xf0
+        status = self._xfer(1) and self.slots[0] != 0xf0
+        self._baudrate(SLOT_BAUD)
+        assert status is True or required is False, "Onewire device missing"
+        return status
+
+    def readbit(self):
+        self.slots[0] = 0xff
+        if not self._xfer(1):
+            return 1
+        return self.slots[0] & 1
+
+    def readbyte(self):
+        buf = bytearray(1)
+        self.readinto(buf)
+        return buf[0]
+
+    def readbytes(self, count):
+        buf = bytearray(count)
+        self.readinto(buf)
+        return buf
+
+    def readinto(self, buf):
+        slots = self.slots
+        for start in range(0, len(buf), 8):
+            n = min(8, len(buf) - start)
+            for j in range(n * 8):
+                slots[j] = 0xff
+            self._xfer(n * 8)
+            self._collect(buf, start, n)
+
+    def writebit(self, value, powerpin=None):
+        self.slots[0] = 0xff if value else 0x00
+        self._xfer(1)
+        if powerpin:
+            powerpin(self.PULLUP_ON)
+
+    def writebyte(self, value, powerpin=None):
+        self._fill((value,), 0, 1)
+        self._xfer(8)
+        if powerpin:
+            powerpin(self.PULLUP_ON)
+
+    def write(self, buf):
+        for start in range(0, len(buf), 8):
+            n = min(8, len(buf) - start)
+            self._fill(buf, start, n)
+            self._xfer(n * 8)
@@ -1,67 +1,392 @@
-import serial
-import matplotlib.pyplot as plt
+import argparse
+import queue
+import threading
 import time
 
-# Setup serial connection
-ser = serial.Serial('COM3', 115200, timeout=1)
+import matplotlib.pyplot as plt
+import numpy as np
+import serial
+
+
+class RingBuffer:
+    """
+    Fixed-size time/value history. Every sample is written twice, at i and
+    i + capacity, so the newest `capacity` samples are always one
+    contiguous slice and view() never copies.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.t = np.zeros(2 * capacity)
+        self.y = np.zeros(2 * capacity)
+        self.head = 0  # next write position, 0 <= head < capacity
+        self.count = 0
+
+    def append(self, t, y):
+        i = self.head
+        self.t[i] = self.t[i + self.capacity] = t
+        self.y[i] = self.y[i + self.capacity] = y
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def extend(self, ts, ys):
+        ts = np.asarray(ts, dtype=float)[-self.capacity:]
+        ys = np.asarray(ys, dtype=float)[-self.capacity:]
+        idx = (self.head + np.arange(len(ts))) % self.capacity
+        self.t[idx] = self.t[idx + self.capacity] = ts
+        self.y[idx] = self.y[idx + self.capacity] = ys
+        self.head = (self.head + len(ts)) % self.capacity
+        self.count = min(self.count + len(ts), self.capacity)
+
+    def view(self):
+        end = self.head + self.capacity
+        return self.t[end - self.count:end], self.y[end - self.count:end]
+
+
+def decimate(t, y, buckets):
+    """
+    Min/max decimation: when there are more points than buckets (pixels),
+    keep the min and max of each bucket so spikes stay visible.
+    """
+    n = len(t)
+    if n <= 2 * buckets:
+        return t, y
+    k = -(-n // buckets)
+    n -= n % k
+    t = t[-n:].reshape(-1, k)
+    y = y[-n:].reshape(-1, k)
+    out_t = np.repeat(t[:, 0], 2)
+    out_y = np.column_stack((y.min(axis=1), y.max(axis=1))).ravel()
+    return out_t, out_y
+
+
+class LivePlot:
+    """
+    Blitted scrolling plot. x is "seconds ago", so the x limits never move
+    and only a y-range change forces a full redraw.
+    """
+
+    def __init__(self, window, fps):
+        self.window = window
+        self.frame_s = 1.0 / fps
+        self.last_frame = 0.0
+        self.stop_requested = False
+
+        self.fig, self.ax = plt.subplots()
+        self.line, = self.ax.plot([], [], label="Temp (°C)", color='blue', animated=True)
+        self.ax.set_xlabel("Time (s)")
+        self.ax.set_ylabel("Temperature (°C)")
+        self.ax.set_title("Live Temperature Data")
+        self.ax.legend()
+        self.ax.set_xlim(-window, 0)
+        self.ax.set_ylim(0, 1)
+        self.background = None
+        self.fig.canvas.mpl_connect('key_press_event', self.on_key)
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+        plt.show(block=False)
+        plt.pause(0.1)
+
+    def on_key(self, event):
+        if event.key == 'q':
+            self.stop_requested = True
+            print("Stopping plot (key 'q' pressed).")
+
+    def on_draw(self, event):
+        self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+
+    def rescale(self, y):
+        # Grow/shrink the y range with some headroom, but not every frame
+        lo, hi = self.ax.get_ylim()
+        ymin, ymax = float(y.min()), float(y.max())
+        pad = max(0.5, (ymax - ymin) * 0.1)
+        if ymin < lo or ymax > hi or (hi - lo) > 4 * (ymax - ymin + 2 * pad):
+            self.ax.set_ylim(ymin - pad, ymax + pad)
+            self.fig.canvas.draw()  # refreshes the cached background
+            return True
+        return False
+
+    def update(self, history, now):
+        """Redraw if a frame is due. Returns False once the window is closed."""
+        if not plt.fignum_exists(self.fig.number):
+            return False
+        if now - self.last_frame < self.frame_s:
+            return True
+        self.last_frame = now
+
+        t, y = history.view()
+        start = np.searchsorted(t, now - self.window)
+        t, y = t[start:], y[start:]
+        if len(t):
+            width = int(self.ax.bbox.width)
+            t, y = decimate(t, y, max(width, 1))
+            self.line.set_data(t - now, y)
+            self.rescale(y)
+
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw()
+        canvas.restore_region(self.background)
+        self.ax.draw_artist(self.line)
+        canvas.blit(self.ax.bbox)
+        canvas.flush_events()
+        return True
+
 
-temps = []
-times = []
-start_time = time.time()
+_DIGIT_0 = ord("0")
+_DIGIT_9 = ord("9")
+_MINUS = ord("-")
+_PLUS = ord("+")
+_DOT = ord(".")
+_SPACE = b" \t\r"
 
-plt.ion()
-fig, ax = plt.subplots()
-line_plot, = ax.plot([], [], label="Temp (°C)", color='blue')
-ax.set_xlabel("Time (s)")
-ax.set_ylabel("Temperature (°C)")
-ax.set_title("Live Temperature Data")
-ax.legend()
 
-print("Listening for temperature data...")
-stop_requested = False
+def parse_number(view, i, end):
+    """
+    The decimal number in view[i:end], read byte by byte so the line is
+    never copied or decoded. Blanks around it are skipped; None if
+    anything else is there.
+    """
+    while i < end and view[i] in _SPACE:
+        i += 1
+    while end > i and view[end - 1] in _SPACE:
+        end -= 1
+    if i < end and view[i] in (_MINUS, _PLUS):
+        sign = -1 if view[i] == _MINUS else 1
+        i += 1
+    else:
+        sign = 1
+    mant = 0
+    scale = 0
+    digits = 0
+    dot = False
+    while i < end:
+        c = view[i]
+        if _DIGIT_0 <= c <= _DIGIT_9:
+            mant = mant * 10 + c - _DIGIT_0
+            digits += 1
+            if dot:
+                scale += 1
+        elif c == _DOT and not dot:
+            dot = True
+        else:
+            return None
+        i += 1
+    if not digits:
+        return None
+    return sign * mant / 10 ** scale
 
-def on_key(event):
-    global stop_requested
-    if event.key == 'q':
-        stop_requested = True
-        print("Stopping plot (key 'q' pressed).")
 
-fig.canvas.mpl_connect('key_press_event', on_key)
+class LineFramer:
+    """
+    Splits a byte stream into lines and pulls the number after "Temp:" out
+    of each one. Bytes go into a fixed buffer that lines are found in with
+    find() and parsed from through a memoryview, so no line is copied,
+    decoded or split into strings; only the parsed floats are new. A
+    partial last line is moved to the front of the buffer, and a line
+    longer than the whole buffer is dropped and counted as bad.
+    """
 
-try:
-    while not stop_requested:
-        line = ser.readline().decode().strip()
-        if "Temp:" in line:
+    def __init__(self, capacity=65536):
+        self.buf = bytearray(capacity)
+        self.view = memoryview(self.buf)
+        self.n = 0  # bytes held, the partial line after a feed()
+        self.bad = 0
+
+    def feed(self, data, out):
+        data = memoryview(data)
+        while len(data):
+            room = len(self.buf) - self.n
+            if not room:
+                self.n = 0  # one line filled the buffer
+                self.bad += 1
+                room = len(self.buf)
+            k = min(room, len(data))
+            self.view[self.n:self.n + k] = data[:k]
+            self.n += k
+            data = data[k:]
+            self._lines(out)
+        return out
+
+    def _lines(self, out):
+        buf = self.buf
+        view = self.view
+        n = self.n
+        pos = 0
+        while True:
+            end = buf.find(b"\n", pos, n)
+            if end < 0:
+                break
+            i = buf.find(b"Temp:", pos, end)
+            if i >= 0:
+                value = parse_number(view, i + 5, end)
+                if value is None:
+                    self.bad += 1
+                else:
+                    out.append(value)
+            pos = end + 1
+        if pos:
+            view[:n - pos] = view[pos:n]
+            self.n = n - pos
+
+
+class FileSource:
+    """
+    Replays a captured serial log as if it were a port, at `rate` lines per
+    second (0 replays as fast as possible).
+    """
+
+    def __init__(self, path, rate):
+        with open(path, "rb") as f:
+            self.lines = f.read().splitlines(keepends=True)
+        self.rate = rate
+        self.sent = 0
+        self.start = time.time()
+
+    def _due(self):
+        if self.rate <= 0:
+            return len(self.lines)
+        return min(len(self.lines), int((time.time() - self.start) * self.rate))
+
+    @property
+    def in_waiting(self):
+        due = self._due()
+        size = 0
+        i = self.sent
+        while i < due and size < 65536:
+            size += len(self.lines[i])
+            i += 1
+        return size
+
+    def read(self, n=1):
+        if self.sent >= len(self.lines):
+            raise EOFError
+        due = self._due()
+        end = self.sent
+        size = 0
+        while end < due and size < n:
+            size += len(self.lines[end])
+            end += 1
+        if end == self.sent:
+            time.sleep(0.001)
+            return b""
+        data = b"".join(self.lines[self.sent:end])
+        self.sent = end
+        return data
+
+    def close(self):
+        pass
+
+
+class SerialReader(threading.Thread):
+    """
+    Bulk-reads the port on its own thread and hands (times, temps) batches
+    to the plotter through a bounded queue. If the plotter falls behind,
+    batches are merged here instead of blocking the port.
+    """
+
+    def __init__(self, source, batches, start_time, capture=None):
+        super().__init__(daemon=True)
+        self.source = source
+        self.batches = batches
+        self.start_time = start_time
+        self.capture = capture
+        self.framer = LineFramer()
+        self.stopped = threading.Event()
+        self.bytes_read = 0
+        self.merged = 0
+
+    def run(self):
+        source = self.source
+        pending = []
+        last = time.time() - self.start_time
+        while not self.stopped.is_set():
             try:
-                temp_str = line.split("Temp:")[1].strip()
-                temp = float(temp_str)
-                current_time = time.time() - start_time
-
-                # Append new data
-                temps.append(temp)
-                times.append(current_time)
-
-                # Keep only the last 10 seconds of data
-                while times and (current_time - times[0]) > 10:
-                    times.pop(0)
-                    temps.pop(0)
-
-                # Update plot data
-                line_plot.set_data(times, temps)
-                ax.set_xlim(max(0, current_time - 10), current_time)
-                ax.relim()
-                ax.autoscale_view(scalex=False)  # Only autoscale y-axis
-
-                plt.draw()
-                plt.pause(0.001)
-
-            except ValueError:
-                print("Couldn't parse temperature from:", line)
-
-except KeyboardInterrupt:
-    print("Plotting stopped by user (Ctrl+C).")
-
-finally:
-    ser.close()
-    plt.ioff()
-    plt.show()
\ No newline at end of file
+                data = source.read(source.in_waiting or 1)
+            except (EOFError, OSError):
+                break
+            if not data:
+                continue
+            self.bytes_read += len(data)
+            if self.capture:
+                self.capture.write(data)
+            now = time.time() - self.start_time
+            temps = self.framer.feed(data, [])
+            if temps:
+                # Spread the chunk's samples over the time since the last one
+                times = np.linspace(last, now, len(temps) + 1)[1:]
+                pending.append((times, np.asarray(temps)))
+                last = now
+            if pending:
+                try:
+                    self.batches.put_nowait(pending)
+                    pending = []
+                except queue.Full:
+                    self.merged += 1
+        if not self.stopped.is_set():
+            if pending:
+                self.batches.put(pending)
+            self.batches.put(None)  # end of stream
+
+    def stop(self):
+        self.stopped.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live plot of 'Temp:' lines from a serial port")
+    parser.add_argument("--port", default="COM3", help="serial port or pty path")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--window", type=float, default=10.0, help="seconds of history shown")
+    parser.add_argument("--capacity", type=int, default=100_000, help="samples kept")
+    parser.add_argument("--fps", type=float, default=30.0, help="redraw rate cap")
+    parser.add_argument("--replay", help="plot a captured log instead of a port")
+    parser.add_argument("--rate", type=float, default=0.0, help="replay lines per second, 0 = as fast as possible")
+    parser.add_argument("--capture", help="also save the raw serial bytes to this file")
+    args = parser.parse_args()
+
+    # Setup serial connection
+    if args.replay:
+        source = FileSource(args.replay, args.rate)
+    else:
+        source = serial.Serial(args.port, args.baud, timeout=0.05)
+    capture = open(args.capture, "wb") if args.capture else None
+    history = RingBuffer(args.capacity)
+    plot = LivePlot(args.window, args.fps)
+    start_time = time.time()
+    batches = queue.Queue(maxsize=64)
+    reader = SerialReader(source, batches, start_time, capture)
+    reader.start()
+
+    print("Listening for temperature data...")
+    try:
+        done = False
+        while not plot.stop_requested and not done:
+            try:
+                batch = batches.get(timeout=plot.frame_s)
+                while batch is not None:
+                    for times, temps in batch:
+                        history.extend(times, temps)
+                    batch = batches.get_nowait()
+                done = True  # reader hit end of stream
+                plot.last_frame = 0.0
+            except queue.Empty:
+                pass
+            if not plot.update(history, time.time() - start_time):
+                break
+
+    except KeyboardInterrupt:
+        print("Plotting stopped by user (Ctrl+C).")
+
+    finally:
+        reader.stop()
+        reader.join(timeout=1)
+        source.close()
+        if capture:
+            capture.close()
+        if reader.framer.bad:
+            print("Unparseable temperature lines:", reader.framer.bad)
+        plt.ioff()
+        plt.show()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Persistent DS18B20 ROM registry.
+#
+# The known ROMs live in flash as back-to-back 8-byte records, so a boot
+# only has to confirm each known probe with a MATCH_ROM scratchpad read
+# instead of walking the whole search tree. A resumable search run in the
+# background picks up hot-plugged probes and drops dead ones.
+
+import uasyncio as asyncio
+from stats import log, ERROR, WARN
+
+FAMILIES = (0x10, 0x22, 0x28)
+ROM_FILE = "roms.bin"
+
+
+class RomRegistry:
+    def __init__(self, ds, path=ROM_FILE):
+        self.ds = ds
+        self.path = path
+        self.roms = []  # probes currently answering on the bus
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return []
+        crc8 = self.ds.ow.crc8
+        roms = []
+        for i in range(0, len(data) - 7, 8):
+            rom = bytearray(data[i:i + 8])
+            if rom[0] in FAMILIES and crc8(rom) == 0:
+                roms.append(rom)
+        return roms
+
+    def save(self):
+        try:
+            with open(self.path, "wb") as f:
+                for rom in self.roms:
+                    f.write(rom)
+        except OSError as e:
+            log(ERROR, "ROM table not saved:", e)
+
+    def verify(self, rom):
+        # An absent probe reads back all ones, which fails the CRC
+        try:
+            buf = self.ds.read_scratch(rom)
+        except AssertionError:
+            return False
+        # Config register bit 7 always reads 0; on a DS18S20 byte 4 is
+        # reserved and reads 0xff
+        return rom[0] == 0x10 or not buf[4] & 0x80
+
+    def startup(self):
+        known = self.load()
+        if known:
+            self.roms = [rom for rom in known if self.verify(rom)]
+            if len(self.roms) < len(known):
+                log(WARN, "Missing probes:", len(known) - len(self.roms))
+        if not self.roms:
+            self.roms = self.ds.scan()
+            if self.roms:
+                self.save()
+        return self.roms
+
+    async def search(self):
+        # Same walk as OneWire.scan(), but yields between ROM passes
+        ow = self.ds.ow
+        found = []
+        rom = None
+        diff = 65
+        for i in range(0xff):
+            rom, diff = ow._search_rom(rom, diff)
+            if rom and rom[0] in FAMILIES:
+                found.append(rom)
+            if diff == 0:
+                break
+            await asyncio.sleep_ms(0)
+        return found
+
+    async def rescan(self):
+        """
+        Re-enumerate the bus. Returns (added, removed) ROM lists; a probe
+        only counts as removed if the search missed it and it also fails
+        a direct MATCH_ROM check.
+        """
+        found = await self.search()
+        added = [rom for rom in found if rom not in self.roms]
+        removed = [rom for rom in self.roms
+                   if rom not in found and not self.verify(rom)]
+        if added or removed:
+            self.roms = [rom for rom in self.roms if rom not in removed]
+            self.roms += added
+            self.save()
+        return added, removed
@@ -0,0 +1,149 @@
+# Overlapped conversion pipeline for DS18B20 probes sharing one 1-Wire bus.
+#
+# A single SKIP_ROM convert starts every probe converting at once, so one
+# sample costs one conversion time plus a scratchpad read per probe instead
+# of a fixed 750 ms wait for a single probe.
+#
+# In alarm mode the trip threshold is programmed into every probe's TH
+# register, and after each convert one ALARM SEARCH finds the probes at or
+# above it. Only those get a scratchpad read; the rest are read on a
+# slower refresh cadence, which also catches probes that lost TH to a
+# power glitch (it reverts to the EEPROM value).
+
+import time
+import uasyncio as asyncio
+from micropython import const
+
+# Worst-case DS18B20 conversion time (tCONV) in ms for each resolution
+CONV_MS = {9: 94, 10: 188, 11: 375, 12: 750}
+
+_POLL_MS = const(5)
+TL_OFF = -55  # TL at the bottom of the range, so only TH raises alarms
+TH_DEFAULT = 0x4B  # written while no threshold is known
+
+
+class Sampler:
+    def __init__(self, ds, roms, res_bits=12, poll=False, alarm=False, refresh_ms=5000,
+                 reads=None, searches=None):
+        self.ds = ds
+        self.roms = roms
+        self.res_bits = res_bits
+        # Polling the done bit needs externally powered probes: a parasite
+        # one can't hold read slots low while it converts, and with a
+        # strong pull-up that has to stay on for the whole conversion.
+        # READ POWER SUPPLY is asked before the first convert and after
+        # set_roms(); the fixed tCONV wait is used unless every probe
+        # reports external power.
+        self.poll = poll and ds.powerpin is None
+        self.powered = None  # every probe externally powered, None until asked
+        self.temps = [None] * len(roms)  # latest reading per probe, raw 1/16 C
+        self.count = 0
+        self.lock = asyncio.Lock()  # held for the whole convert/read cycle
+        self.alarm = alarm
+        self.refresh_ms = refresh_ms
+        self.th = None  # TH in whole degrees C, None until set_alarm()
+        self.program = False  # TH/resolution need writing to the probes
+        self.refreshed = None  # ticks_ms of the last full read, None forces one
+        self.reads = reads  # stats.Counter of scratchpad reads
+        self.searches = searches  # stats.Counter of alarm searches
+
+    def set_roms(self, roms):
+        self.roms = roms
+        self.temps = [None] * len(roms)
+        self.program = True
+        self.refreshed = None  # new probes have no reading yet
+        self.powered = None
+
+    def set_alarm(self, th):
+        # Written to the probes at the start of the next sample()
+        if th != self.th:
+            self.th = th
+            self.program = True
+
+    def set_resolution(self, res_bits):
+        # Also written at the start of the next sample()
+        if res_bits != self.res_bits:
+            self.res_bits = res_bits
+            self.program = True
+
+    def _program(self):
+        # TH, TL and the resolution share one scratchpad write
+        config = ((self.res_bits - 9) << 5) | 0x1f
+        th = TH_DEFAULT if self.th is None else self.th
+        data = bytes((th & 0xff, TL_OFF & 0xff, config))
+        for rom in self.roms:
+            self.ds.write_scratch(rom, data)
+        self.program = False
+
+    def _read_all(self):
+        ds = self.ds
+        read_raw = ds.read_raw
+        roms = self.roms
+        temps = self.temps
+        th = self.th if self.alarm else None
+        for i in range(len(roms)):
+            temps[i] = read_raw(roms[i])
+            # read_raw leaves the scratchpad in ds.buf
+            if th is not None and temps[i] is not None and ds.buf[2] != th & 0xff:
+                self.program = True
+        if self.reads is not None:
+            self.reads.inc(len(roms))
+        self.refreshed = time.ticks_ms()
+
+    def _read_alarmed(self):
+        # Probes in alarm are read, and so are probes that were at or over
+        # TH but dropped out of alarm, so a stale hot reading doesn't linger
+        # until the next full read. TH compares the whole degrees C.
+        hot = self.ds.alarm_search()
+        if self.searches is not None:
+            self.searches.inc()
+        read_raw = self.ds.read_raw
+        roms = self.roms
+        temps = self.temps
+        th = self.th
+        n = 0
+        for i in range(len(roms)):
+            t = temps[i]
+            if roms[i] in hot or (t is not None and t >> 4 >= th):
+                temps[i] = read_raw(roms[i])
+                n += 1
+        if self.reads is not None:
+            self.reads.inc(n)
+
+    async def wait_conversion(self):
+        conv_ms = CONV_MS[self.res_bits]
+        if not (self.poll and self.powered):
+            await asyncio.sleep_ms(conv_ms)
+            return
+        # Converting probes hold read slots low until they are done
+        readbit = self.ds.ow.readbit
+        deadline = time.ticks_add(time.ticks_ms(), conv_ms)
+        while not readbit():
+            if time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+                break
+            await asyncio.sleep_ms(_POLL_MS)
+
+    async def sample(self):
+        async with self.lock:
+            alarm = self.alarm and self.th is not None
+            if self.program:
+                self._program()
+            if self.poll and self.powered is None:
+                self.powered = self.ds.powermode() == 1
+            self.ds.convert_temp()  # SKIP_ROM broadcast to every probe
+            await self.wait_conversion()
+            if not alarm or self.refreshed is None \
+                    or time.ticks_diff(time.ticks_ms(), self.refreshed) >= self.refresh_ms:
+                self._read_all()
+            else:
+                self._read_alarmed()
+        self.count += 1
+        return self.temps
+
+    def hottest(self):
+        # Highest valid reading, or None if every probe failed its CRC
+        hot = None
+        for t in self.temps:
+            if t is not None and (hot is None or t > hot):
+                hot = t
+        return hot
@@ -0,0 +1,79 @@
+# Adaptive sampling: resolution and interval follow the risk of a trip.
+#
+# Far from the threshold and steady, probes run at 12 bits every couple of
+# seconds. As the margin shrinks, or the estimated time to reach the
+# threshold at the current rate of rise does, the scheduler steps to
+# faster, coarser levels, down to back-to-back 9-bit conversions (~100 ms).
+# It steps back out one level at a time, and only after HOLD samples in a
+# row qualified for a slower level, so a noisy reading can't flap it.
+#
+# With predict_ms set, early_trip() reports when the extrapolated crossing
+# is less than predict_ms away.
+#
+# Everything is integer: readings in centi-degrees F, the rate scaled by
+# RATE_SCALE, times in ms, so a sample costs no float boxing on the heap.
+
+import time
+
+# (margin centi-F, ms to threshold, resolution bits, interval ms), fastest first
+LEVELS = (
+    (500, 10_000, 9, 0),
+    (1500, 60_000, 10, 250),
+    (None, None, 12, 2000),
+)
+HOLD = 5
+RATE_TAU_MS = 2000  # smoothing time constant of the dT/dt estimate
+RATE_SCALE = 16  # rate fraction bits, so the smoothing doesn't stall on rounding
+
+
+class Scheduler:
+    def __init__(self, levels=LEVELS, hold=HOLD, predict_ms=0):
+        self.levels = levels
+        self.hold = hold
+        self.predict_ms = predict_ms
+        self.level = 0  # start fast until the first readings say otherwise
+        self.bits = levels[0][2]  # resolution and interval for the next sample
+        self.interval = levels[0][3]
+        self.calm = 0  # samples in a row that asked for a slower level
+        self.rate = 0  # smoothed rise in centi-F per second, times RATE_SCALE
+        self.eta = None  # ms until the threshold at that rate
+        self.last_temp = None
+        self.last_ms = 0
+
+    def update(self, temp, threshold, now_ms):
+        """Feed a reading in centi-F; sets the bits and interval to use next."""
+        if self.last_temp is not None:
+            dt = time.ticks_diff(now_ms, self.last_ms)
+            if dt > 0:
+                rate = (temp - self.last_temp) * (1000 * RATE_SCALE) // dt
+                self.rate += (rate - self.rate) * dt // (RATE_TAU_MS + dt)
+        self.last_temp = temp
+        self.last_ms = now_ms
+
+        margin = threshold - temp
+        self.eta = margin * (1000 * RATE_SCALE) // self.rate \
+            if self.rate > 0 and margin > 0 else None
+        levels = self.levels
+        target = len(levels) - 1
+        for i in range(len(levels) - 1):
+            near, soon = levels[i][0], levels[i][1]
+            if margin <= near or (self.eta is not None and self.eta <= soon):
+                target = i
+                break
+        if target < self.level:
+            self.level = target
+            self.calm = 0
+        elif target > self.level:
+            self.calm += 1
+            if self.calm >= self.hold:
+                self.level += 1
+                self.calm = 0
+        else:
+            self.calm = 0
+        self.bits = levels[self.level][2]
+        self.interval = levels[self.level][3]
+
+    def early_trip(self):
+        # Extrapolated crossing within predict_ms
+        return bool(self.predict_ms) and self.eta is not None \
+            and self.eta <= self.predict_ms
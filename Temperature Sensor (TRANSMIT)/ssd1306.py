@@ -2,6 +2,8 @@
 
 from micropython import const
 import framebuf
+import time
+import uasyncio as asyncio
 
 
 # register definitions
@@ -26,17 +28,27 @@ SET_CHARGE_PUMP = const(0x8D)
 # Subclassing FrameBuffer provides support for graphics primitives
 # http://docs.micropython.org/en/latest/pyboard/library/framebuf.html
 class SSD1306(framebuf.FrameBuffer):
-    def __init__(self, width, height, external_vcc):
+    def __init__(self, width, height, external_vcc, clear=True):
         self.width = width
         self.height = height
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        self.mv = memoryview(self.buffer)
+        # What the panel RAM currently holds, for show(partial=True)
+        self.shadow = bytearray(len(self.buffer))
+        self.window = bytearray((SET_COL_ADDR, 0, 0, SET_PAGE_ADDR, 0, 0))
+        self.tx_bytes = 0  # running total sent over the bus
+        self.frame_bytes = 0  # sent by the last show()
+        self.frame_us = 0  # bus time of the last show_async(), yields excluded
+        self.page_us = 0  # its longest single page transfer
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
-        self.init_display()
+        self.init_display(clear)
 
-    def init_display(self):
-        for cmd in (
+    def init_display(self, clear=True):
+        # Without clear, the panel RAM holds noise until the first full show()
+        # The whole sequence goes out as one command stream
+        self.write_cmds(bytes((
             SET_DISP | 0x00,  # off
             # address setting
             SET_MEM_ADDR,
@@ -66,11 +78,11 @@ class SSD1306(framebuf.FrameBuffer):
             # charge pump
             SET_CHARGE_PUMP,
             0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01,
-        ):  # on
-            self.write_cmd(cmd)
-        self.fill(0)
-        self.show()
+            SET_DISP | 0x01,  # on
+        )))
+        if clear:
+            self.fill(0)
+            self.show()
 
     def poweroff(self):
         self.write_cmd(SET_DISP | 0x00)
@@ -85,42 +97,99 @@ class SSD1306(framebuf.FrameBuffer):
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
+    def show(self, partial=False):
+        start = self.tx_bytes
+        if partial:
+            self._show_dirty()
+        else:
+            self._window(0, self.pages - 1, 0, self.width - 1, self.buffer)
+            self.shadow[:] = self.buffer
+        self.frame_bytes = self.tx_bytes - start
+
+    def _window(self, p0, p1, x0, x1, data):
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
             x0 += 32
             x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        window = self.window
+        window[1] = x0
+        window[2] = x1
+        window[4] = p0
+        window[5] = p1
+        self.write_cmds(window)
+        self.write_data(data)
+
+    def _show_dirty(self):
+        # Send only the changed column span of each page
+        for page in range(self.pages):
+            self._page(page, True)
+
+    def _page(self, page, partial):
+        # One page, or its changed column span; False if nothing was sent
+        buf = self.buffer
+        shadow = self.shadow
+        width = self.width
+        base = page * width
+        start = base
+        end = base + width
+        if partial:
+            if buf[start:end] == shadow[start:end]:
+                return False
+            while buf[start] == shadow[start]:
+                start += 1
+            while buf[end - 1] == shadow[end - 1]:
+                end -= 1
+        data = self.mv[start:end]
+        self._window(page, page, start - base, end - 1 - base, data)
+        shadow[start:end] = data
+        return True
+
+    async def show_async(self, partial=False):
+        # Like show(), one page per bus transfer with a yield after each,
+        # so the display never holds up other tasks for more than a page
+        start = self.tx_bytes
+        self.frame_us = 0
+        self.page_us = 0
+        for page in range(self.pages):
+            t0 = time.ticks_us()
+            if not self._page(page, partial):
+                continue
+            us = time.ticks_diff(time.ticks_us(), t0)
+            self.frame_us += us
+            if us > self.page_us:
+                self.page_us = us
+            await asyncio.sleep_ms(0)
+        self.frame_bytes = self.tx_bytes - start
 
 
 class SSD1306_I2C(SSD1306):
-    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
+    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False, clear=True):
         self.i2c = i2c
         self.addr = addr
         self.temp = bytearray(2)
         self.write_list = [b"\x40", None]  # Co=0, D/C#=1
-        super().__init__(width, height, external_vcc)
+        self.cmd_list = [b"\x00", None]  # Co=0, D/C#=0: a run of commands
+        super().__init__(width, height, external_vcc, clear)
 
     def write_cmd(self, cmd):
         self.temp[0] = 0x80  # Co=1, D/C#=0
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
+        self.tx_bytes += 2
+
+    def write_cmds(self, cmds):
+        self.cmd_list[1] = cmds
+        self.i2c.writevto(self.addr, self.cmd_list)
+        self.tx_bytes += len(cmds) + 1
 
     def write_data(self, buf):
         self.write_list[1] = buf
         self.i2c.writevto(self.addr, self.write_list)
+        self.tx_bytes += len(buf) + 1
 
 
 class SSD1306_SPI(SSD1306):
-    def __init__(self, width, height, spi, dc, res, cs, external_vcc=False):
+    def __init__(self, width, height, spi, dc, res, cs, external_vcc=False, clear=True):
         self.rate = 10 * 1024 * 1024
         dc.init(dc.OUT, value=0)
         res.init(res.OUT, value=0)
@@ -136,7 +205,7 @@ class SSD1306_SPI(SSD1306):
         self.res(0)
         time.sleep_ms(10)
         self.res(1)
-        super().__init__(width, height, external_vcc)
+        super().__init__(width, height, external_vcc, clear)
 
     def write_cmd(self, cmd):
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
@@ -145,6 +214,16 @@ class SSD1306_SPI(SSD1306):
         self.cs(0)
         self.spi.write(bytearray([cmd]))
         self.cs(1)
+        self.tx_bytes += 1
+
+    def write_cmds(self, cmds):
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs(1)
+        self.dc(0)
+        self.cs(0)
+        self.spi.write(cmds)
+        self.cs(1)
+        self.tx_bytes += len(cmds)
 
     def write_data(self, buf):
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
@@ -152,4 +231,5 @@ class SSD1306_SPI(SSD1306):
         self.dc(1)
         self.cs(0)
         self.spi.write(buf)
-        self.cs(1)
\ No newline at end of file
+        self.cs(1)
+        self.tx_bytes += len(buf)
\ No newline at end of file
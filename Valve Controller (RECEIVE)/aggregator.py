@@ -0,0 +1,160 @@
+# Fan-in of several sensors into one valve decision.
+#
+# Each sensor is keyed by its BLE address and keeps its own last-seen
+# time, sequence number, threshold and latest reading. The valve trips when
+# at least `quorum` sensors are at or over their own thresholds (1 means
+# any of them). Short of that, it goes to the failsafe while any sensor
+# seen since boot is stale or sent a frame that didn't decode, since its
+# sink is then unwatched, or while no sensor has been heard at all. A trip
+# always wins over the failsafe.
+#
+# A sensor stale for forget_ms is dropped, freeing its slot for a
+# replacement, and its address is handed to forgotten(), if given. Its
+# sink is still unwatched, so it keeps holding the failsafe until it
+# reports again or the reset button is pressed.
+# Readings from new sensors while all max_sensors slots are taken are
+# ignored and counted.
+#
+# Only a new reading or a bad frame can trip, open or re-close the valve.
+# check() runs on a timer and only enters the failsafe, so it never acts
+# on a reading twice. A reset clears every sensor's over flag, so
+# RESET_PENDING is resolved by the next reading to arrive, not by one
+# taken before the press.
+
+import time
+from valvestate import FAILSAFE, RESET_PENDING
+from stats import log, WARN
+
+
+class Sensor:
+    def __init__(self, addr, now):
+        self.addr = addr
+        self.seen = now  # ticks_ms of the last valid reading
+        self.seq = None
+        self.threshold = None  # centi-degrees F
+        self.temp = None  # hottest sample of the last reading, centi-degrees F
+        self.over = False
+        self.stale = False
+        self.bad = False  # last frame didn't decode
+
+
+class Aggregator:
+    def __init__(self, state, quorum=1, stale_ms=6000, max_sensors=4, missed=None, stale=None,
+                 forget_ms=0, dropped=None, forgotten=None):
+        self.state = state  # ValveState
+        self.quorum = quorum
+        self.stale_ms = stale_ms
+        self.max_sensors = max_sensors
+        self.missed = missed  # stats.Counter of sequence gaps
+        self.stale = stale  # stats.Counter of sensors going stale
+        self.forget_ms = forget_ms  # drop a sensor stale this long, 0 keeps every sensor
+        self.dropped = dropped  # stats.Counter of readings ignored for want of a slot
+        self.gone = set()  # forgotten addresses, holding the failsafe
+        self.forgotten = forgotten  # called with the address of each sensor dropped
+        self.sensors = {}
+        self.order = []  # the same sensors, iterated without a dict view
+        self.started = time.ticks_ms()
+
+    def get(self, addr):
+        # Entry for addr, created on first sight; None while max_sensors are known
+        s = self.sensors.get(addr)
+        if s is None:
+            if len(self.sensors) < self.max_sensors:
+                s = Sensor(addr, time.ticks_ms())
+                self.sensors[addr] = s
+                self.order.append(s)
+            elif self.dropped is not None:
+                self.dropped.inc()
+        return s
+
+    def update(self, addr, seq, temp, threshold, over):
+        s = self.get(addr)
+        if s is None:
+            if over:
+                log(WARN, "Over-threshold reading ignored, no slot for", addr)
+            return
+        self.gone.discard(addr)  # back after being forgotten
+        if seq is not None:
+            if s.seq is not None and self.missed is not None:
+                self.missed.inc((seq - s.seq - 1) & 0xff)
+            s.seq = seq
+        s.seen = time.ticks_ms()
+        s.temp = temp
+        s.threshold = threshold
+        s.over = over
+        s.stale = False
+        s.bad = False
+        self.decide()
+
+    def fault(self, addr):
+        s = self.get(addr)
+        if s is not None:
+            s.bad = True
+            self.decide()
+
+    def check(self):
+        # Mark sensors past the deadline; returns the age of the oldest
+        # reading in ms, or the time since boot while there are none
+        now = time.ticks_ms()
+        if not self.sensors:
+            age = time.ticks_diff(now, self.started)
+            if age >= self.stale_ms:
+                self.state.fault("no sensor")
+            return age
+        oldest = 0
+        order = self.order
+        i = 0
+        while i < len(order):
+            s = order[i]
+            age = time.ticks_diff(now, s.seen)
+            if age > oldest:
+                oldest = age
+            if self.forget_ms and age >= self.forget_ms:
+                log(WARN, "Sensor", s.addr, "forgotten after", age, "ms")
+                del order[i]
+                del self.sensors[s.addr]
+                self.gone.add(s.addr)
+                if self.forgotten is not None:
+                    self.forgotten(s.addr)
+                continue
+            i += 1
+            if age >= self.stale_ms and not s.stale:
+                s.stale = True
+                if self.stale is not None:
+                    self.stale.inc()
+        if not order:
+            self.state.fault("no sensor")
+        else:
+            self.decide(False)
+        return oldest
+
+    def reset(self):
+        # Reset button: readings from before the press can't re-trip, and
+        # forgotten sensors stop holding the failsafe; a new reading still
+        # has to take the valve out of it
+        if self.gone:
+            log(WARN, "Reset clears", len(self.gone), "forgotten sensor(s)")
+            self.gone.clear()
+        self.state.reset()
+        if self.state.state == RESET_PENDING:
+            for s in self.order:
+                s.over = False
+
+    def decide(self, fresh=True):
+        # fresh: a reading or bad frame just came in; without one, only the
+        # failsafe can be entered
+        over = 0
+        unwatched = len(self.gone)
+        for s in self.order:
+            if s.over:
+                over += 1
+            if s.stale or s.bad:
+                unwatched += 1
+        if over >= self.quorum:
+            if fresh:
+                self.state.reading(True)
+        elif unwatched:
+            if self.state.state != FAILSAFE:
+                self.state.fault(str(unwatched) + " sensor(s) stale, bad or gone")
+        elif fresh:
+            self.state.reading(False)
@@ -0,0 +1,28 @@
+# Connection parameter updates.
+#
+# The same file ships on both boards. The central asks for a connection
+# interval range when it connects; MicroPython doesn't report what the
+# controller picked then, only the parameters a later update puts in force
+# (_IRQ_CONNECTION_UPDATE), by either end or by the controller. Each
+# update is logged; a link that is never updated logs nothing here.
+
+from micropython import const
+from aioble import core
+from stats import log, WARN, INFO
+
+_IRQ_CONNECTION_UPDATE = const(27)
+
+
+def _irq(event, data):
+    if event == _IRQ_CONNECTION_UPDATE:
+        conn_handle, interval, latency, timeout, status = data
+        if status:
+            log(WARN, "Connection update failed:", status)
+            return None
+        # Interval in 1.25 ms units, supervision timeout in 10 ms units
+        log(INFO, "Link", conn_handle, "updated: interval", interval * 1250, "us, latency",
+            latency, "| timeout", timeout * 10, "ms")
+    return None
+
+
+core.register_irq_handler(_irq, None)
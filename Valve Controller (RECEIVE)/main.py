@@ -2,91 +2,392 @@ import uasyncio as asyncio
 import aioble
 import bluetooth
 import struct
+import time
+import telemetry
+from aioble.client import ClientService, ClientCharacteristic
+import machine
 from machine import Pin
+import stats
+import connparams  # logs connection parameter updates
+from valvestate import ValveState
+from aggregator import Aggregator
+from stats import log, ERROR, WARN, INFO, DEBUG
 
 # Existing hardware and BLE setup (matches ESP32C6 configuration[3])
 SERVICE_UUID = bluetooth.UUID("af65f22f-0b5c-4ac5-a2a1-76606258c2b0")
 CHARACTERISTIC_UUID = bluetooth.UUID("19b10001-e8f2-537e-4f6c-d104768a1214")
+TRANSPORT = "gatt"  # "gatt" connects to the sensor, "broadcast" listens to its adverts
+BLE_MTU = 247  # fits a full telemetry batch in one notification
+LINK_FILE = "link.bin"  # cached sensor address and characteristic handles
+LINK_FORMAT = "<B6sHHH"
+FAST_CONNECT_MS = 500  # directed reconnect timeout
+FAST_RETRIES = 3  # failed connects in a row before falling back to a full scan
+# Connection interval asked for on every connect, reconnects included.
+# MicroPython only sets it when connecting, and a link is never dropped to
+# change it: a reconnect would leave the valve deaf for longer than a
+# slower interval ever could.
+MIN_CONN_INTERVAL_US = 7_500
+MAX_CONN_INTERVAL_US = 15_000  # a notify waits at most one short interval
+MAX_SENSORS = 4  # sensors served at once, each on its own connection
+QUORUM = 1  # sensors at or over their threshold needed to trip, 1 = any
+SCAN_MS = 2000  # scan for another sensor this long at a time
+SCAN_IDLE_MS = 10_000  # pause after a scan that found none
 VALVE_PIN = 4
 RESET_PIN = 15
+DEBOUNCE_MS = 50  # button edges closer together than this are contact bounce
+STALE_MS = 6000  # failsafe when a sensor sends no valid reading this long, 3x its slowest frame gap
+FORGET_MS = 60_000  # a sensor silent this long is dropped, freeing its slot and the failsafe
+FAILSAFE_CLOSE = False  # failsafe closes the valve, False holds it as it was
+WDT_MS = 30_000  # watchdog timeout, longer than a full scan plus connect; 0 disables it
+SUPERVISE_MS = 250  # staleness check and watchdog feed period
+GC_BUDGET = 8_000  # collect at an idle point once this much was allocated
+GC_THRESHOLD = 32_000  # automatic collection backstop, bytes
+LOG_LEVEL = stats.ERROR  # console output, stats.DEBUG shows every reading
+
+stats.level = LOG_LEVEL
+stats.threshold(GC_THRESHOLD)
+t_frame = stats.Timer("frame")  # notification in hand -> valve set
+t_reconnect = stats.Timer("reconnect", "ms")  # link lost -> subscribed again, per sensor
+a_frame = stats.Alloc("alloc_frame")  # heap bytes per frame handled, 0 when allocation-free
+n_frames = stats.Counter("frames")
+n_invalid = stats.Counter("invalid")
+n_no_reading = stats.Counter("no_reading")  # frames or adverts with every probe INVALID
+n_errors = stats.Counter("errors")
+n_trips = stats.Counter("trips")
+n_missed = stats.Counter("missed")  # sequence gaps: frames over GATT, readings when broadcast
+n_stale = stats.Counter("stale")  # staleness deadlines missed, per sensor
+n_stale_ms = stats.Counter("stale_ms")  # age of the stalest sensor's reading, 0 if all fresh
+n_dropped = stats.Counter("dropped")  # readings ignored, every sensor slot taken
+p_scan = stats.Phase("boot_scan")  # first scan started
+p_link = stats.Phase("boot_link")  # first sensor subscribed
+p_frame = stats.Phase("boot_frame")  # first reading decided on
 
 valve = Pin(VALVE_PIN, Pin.OUT)
-valve.off()
+state = ValveState(valve, 1 if FAILSAFE_CLOSE else None, n_trips)
+frame = telemetry.Frame()  # decode target, reused for every frame and advert
+sensors = Aggregator(state, QUORUM, STALE_MS, MAX_SENSORS, n_missed, n_stale,
+                     FORGET_MS, n_dropped)
+RECEIVER = "receiver"  # find_sensors() or ble_listener(), in waiting
+waiting = set()  # receivers and sensor links with no progress since the last watchdog feed
 button = Pin(RESET_PIN, Pin.IN, Pin.PULL_UP)
-tripped = False  # Shared state flag
+pressed = asyncio.ThreadSafeFlag()
+last_edge = time.ticks_ms()
+
+# Button IRQ, both edges: a press is a falling edge after DEBOUNCE_MS
+# without any edge, so bounces on press and release are both ignored
+def on_button(pin):
+    global last_edge
+    now = time.ticks_ms()
+    if time.ticks_diff(now, last_edge) >= DEBOUNCE_MS and pin.value() == 0:
+        pressed.set()
+    last_edge = now
+
+button.irq(on_button, Pin.IRQ_FALLING | Pin.IRQ_RISING)
 
 async def watch_button():
-    global tripped
     while True:
-        if button.value() == 0:  # Active-low button press
-            print("Reset button pressed")
-            tripped = False
-            valve.off()
-            # Debounce logic
-            while button.value() == 0:
-                await asyncio.sleep(0.1)
-            await asyncio.sleep(0.1)
-        await asyncio.sleep(0.05)
-
-async def ble_receiver():
-    global tripped
+        await pressed.wait()
+        log(WARN, "Reset button pressed")
+        sensors.reset()
+
+# Staleness deadline and watchdog. The watchdog is fed only once the
+# receiver loop and every sensor link have made progress since the last
+# feed: a frame handled, a connect attempt finished, a scan done. A wedged
+# link, receiver or aggregator (or a blocked event loop) resets the board
+# instead of leaving the valve unsupervised.
+def progress(who):
+    waiting.discard(who)
+
+async def supervise():
+    wdt = machine.WDT(timeout=WDT_MS) if WDT_MS else None
     while True:
+        age = sensors.check()
+        n_stale_ms.value = age if age >= STALE_MS else 0
+        if wdt is not None and not waiting:
+            wdt.feed()
+            waiting.update(active)
+            waiting.add(RECEIVER)
+        await asyncio.sleep_ms(SUPERVISE_MS)
+
+# Cached sensor links, back-to-back records of
+# (addr_type, addr, value_handle, end_handle, properties)
+def load_links():
+    links = {}
+    try:
+        with open(LINK_FILE, "rb") as f:
+            data = f.read()
+    except OSError:
+        return links
+    size = struct.calcsize(LINK_FORMAT)
+    for i in range(0, len(data) - size + 1, size):
+        link = struct.unpack_from(LINK_FORMAT, data, i)
+        links[bytes(link[1])] = link
+    return links
+
+def save_links():
+    try:
+        with open(LINK_FILE, "wb") as f:
+            for link in links.values():
+                f.write(struct.pack(LINK_FORMAT, *link))
+    except OSError as e:
+        log(ERROR, "Link cache not saved:", e)
+
+def forget_link(addr):
+    # A sensor gone for good: no more directed connects to it at boot
+    lost.pop(addr, None)
+    if links.pop(addr, None) is not None:
+        log(INFO, "Cached link dropped:", addr)
+        save_links()
+
+links = load_links()  # by sensor address
+sensors.forgotten = forget_link
+active = set()  # addresses with a sensor_link() task running
+lost = {}  # ticks_ms each sensor's link dropped, kept across its sensor_link() tasks
+radio = asyncio.Lock()  # one scan or connection attempt at a time
+scanning = None  # find_sensors()'s scan in progress, cancelled by connects
+gave_up = asyncio.Event()  # a sensor_link() task ended, scan for it now
+
+async def scan_for_sensor():
+    # First advertising sensor that isn't connected yet
+    global scanning
+    log(INFO, "\n--- Starting BLE scan ---")
+    p_scan.hit()
+    async with aioble.scan(SCAN_MS) as scanner:
+        scanning = scanner
         try:
-            print("\n--- Starting BLE scan ---")
-            async with aioble.scan(10000) as scanner:
-                target = None
-                async for result in scanner:
-                    if SERVICE_UUID in result.services():
-                        print(f"✅ Found device: {result.name()}")
-                        target = result.device
-                        break
-                
-                if not target:
-                    print("🔍 No device found")
-                    await asyncio.sleep(2)
-                    continue
-
-            print("\n--- Connecting ---")
-            connection = await target.connect(timeout_ms=10_000)
-            
+            async for result in scanner:
+                if SERVICE_UUID in result.services() and bytes(result.device.addr) not in active:
+                    log(INFO, "✅ Found device:", result.name())
+                    return result.device
+        finally:
+            scanning = None
+    return None
+
+async def claim_radio():
+    # A connect doesn't wait out a background scan: cancel it, then queue
+    # for the radio
+    if scanning is not None:
+        log(INFO, "Scan cancelled for a connect")
+        await scanning.cancel()
+    await radio.acquire()
+
+async def subscribe_cached(connection, link):
+    # Rebuild the characteristic from cached handles, skipping service and
+    # characteristic discovery. The sensor's GATT table is fixed, so the
+    # handles survive reboots on both ends.
+    service = ClientService(connection, 1, 0xffff, SERVICE_UUID)
+    char = ClientCharacteristic(service, link[3], link[2], link[4], CHARACTERISTIC_UUID)
+    await char.subscribe(notify=True)
+    return char
+
+async def subscribe_discovered(connection):
+    log(INFO, "🔗 Discovering services...")
+    service = await connection.service(SERVICE_UUID)
+    char = await service.characteristic(CHARACTERISTIC_UUID)
+    await char.subscribe(notify=True)
+    return char
+
+def record_reconnect(ms):
+    t_reconnect.add(ms)
+    log(INFO, "⏱️ Reconnect:", ms, "ms (max", t_reconnect.max, "avg", t_reconnect.avg(), ")")
+
+def on_frame(addr, data):
+    t_frame.start()
+    a_frame.start()
+    n_frames.inc()
+    try:
+        if frame.decode(data):
+            values = frame.values
+            threshold = frame.threshold
+            if stats.level >= DEBUG:
+                log(DEBUG, "🌡️ Current:", values[:frame.n], "| Threshold:", threshold)
+
+            # trip on any sample in the frame
+            over = False
+            hot = telemetry.INVALID
+            for i in range(frame.n):
+                v = values[i]
+                if v != telemetry.INVALID:
+                    if v >= threshold:
+                        over = True
+                    if v > hot:
+                        hot = v
+            if hot == telemetry.INVALID:
+                # Every probe failed: the sink is unwatched, not healthy
+                n_no_reading.inc()
+                sensors.fault(addr)
+            else:
+                sensors.update(addr, frame.seq, hot, threshold, over)
+                p_frame.hit()
+        else: # invalid daya
+            n_invalid.inc()
+            sensors.fault(addr)
+
+    except Exception as e:
+        n_errors.inc()
+        log(ERROR, "Data error:", e)
+        sensors.fault(addr)
+    a_frame.stop()
+    t_frame.stop()
+
+# One sensor's connection, reconnecting directly to its address; gives up
+# after FAST_RETRIES failed connects in a row and leaves it to
+# find_sensors(). Losing a link that was up doesn't count as a failure.
+# A cached sensor that was never heard from since boot is dropped from
+# the cache when its task gives up, so a dead one doesn't cost every boot
+# its connect attempts; one heard before is dropped when the aggregator
+# forgets it.
+async def sensor_link(device):
+    addr = bytes(device.addr)
+    failures = 0
+    try:
+        while failures < FAST_RETRIES:
+            link = links.get(addr)
+            log(INFO, "\n--- Connecting ---")
             try:
-                print("🔗 Discovering services...")
-                service = await connection.service(SERVICE_UUID)
-                char = await service.characteristic(CHARACTERISTIC_UUID)
-                await char.subscribe(notify=True)
-                
-                print("🚀 Ready for data")
+                await claim_radio()
+                try:
+                    connection = await device.connect(
+                        timeout_ms=FAST_CONNECT_MS if link else 10_000,
+                        min_conn_interval_us=MIN_CONN_INTERVAL_US,
+                        max_conn_interval_us=MAX_CONN_INTERVAL_US)
+                finally:
+                    radio.release()
+                    progress(addr)  # attempt over, connected or not
+            except Exception as e:
+                failures += 1
+                log(WARN, "Connect failed", failures, e)
+                continue
+
+            up = False  # subscribed, so a drop is a lost link rather than a failure
+            try:
+                try:
+                    log(INFO, "MTU:", await connection.exchange_mtu(BLE_MTU))
+                except Exception as e:
+                    log(WARN, "MTU exchange failed:", e)
+                char = None
+                if link:
+                    try:
+                        char = await subscribe_cached(connection, link)
+                    except Exception as e:
+                        log(WARN, "Cached handles rejected:", e)
+                if char is None:
+                    char = await subscribe_discovered(connection)
+                    links[addr] = (device.addr_type, addr, char._value_handle,
+                                   char._end_handle, char.properties)
+                    save_links()
+                failures = 0
+                up = True
+                p_link.hit()
+                lost_at = lost.pop(addr, None)  # None on the first connect
+                if lost_at is not None:
+                    record_reconnect(time.ticks_diff(time.ticks_ms(), lost_at))
+
+                log(INFO, "🚀 Ready for data")
                 while True:
-                    data = await char.notified()
                     try:
-                        if len(data) == 8:
-                            temp, threshold = struct.unpack("<ff", data)
-                            print(f"🌡️ Current: {temp} | Threshold: {threshold}")
-                            
-                            # latch trigger
-                            if temp >= threshold:
-                                tripped = True
-                        else: # invalid daya
-                            tripped = False
-
-                        valve.value(tripped)
+                        data = await char.notified(STALE_MS)
+                    except asyncio.TimeoutError:
+                        # Link up but silent: reconnect, the supervisor
+                        # has already entered the failsafe
+                        log(WARN, "No data for", STALE_MS, "ms")
+                        break
+                    on_frame(addr, data)
+                    progress(addr)
+                    stats.collect(GC_BUDGET)  # next frame is a sample period away
 
-                    except Exception as e:
-                        print(f"Data error: {e}")
-                        tripped = False
-                        valve.off()
-            
             except Exception as e:
-                print(f"Connection error: {e}")
+                if not up:
+                    failures += 1
+                log(WARN, "Connection error:", e)
             finally:
                 await connection.disconnect()
-                print("🔌 Disconnected")
+                if up:
+                    # Timed until it's back, by this task or after a scan
+                    lost[addr] = time.ticks_ms()
+                log(INFO, "🔌 Disconnected")
+    finally:
+        active.discard(addr)
+        waiting.discard(addr)
+        if addr not in sensors.sensors:
+            forget_link(addr)
+        gave_up.set()
 
+def start_link(device):
+    # Counted in active before the task first runs, so MAX_SENSORS holds
+    active.add(bytes(device.addr))
+    asyncio.create_task(sensor_link(device))
+
+# Keeps a sensor_link() task per sensor, up to MAX_SENSORS: first the
+# cached ones, each tried once as slots come free, then any new sensor a
+# scan turns up. A scan that finds none is repeated after SCAN_IDLE_MS, or
+# as soon as a sensor_link() gives up.
+async def find_sensors():
+    cached = list(links.values())
+    while True:
+        progress(RECEIVER)  # a scan or idle wait done
+        while cached and len(active) < MAX_SENSORS:
+            link = cached.pop(0)
+            if link[1] not in active:  # a scan may have found it first
+                start_link(aioble.Device(link[0], link[1]))
+        device = None
+        if len(active) < MAX_SENSORS:
+            try:
+                async with radio:
+                    device = await scan_for_sensor()
+            except Exception as e:
+                log(ERROR, "Scan error:", e)
+        if device is None:
+            try:
+                await asyncio.wait_for_ms(gave_up.wait(), SCAN_IDLE_MS)
+            except asyncio.TimeoutError:
+                pass
+            gave_up.clear()
+            continue
+        start_link(device)
+        await asyncio.sleep_ms(0)  # let it take the radio before the next scan
+
+# Connectionless mode: passive scan for readings in the sensors' adverts
+async def ble_listener():
+    last_seq = {}  # per sensor address, adverts repeat until the next reading
+    while True:
+        progress(RECEIVER)  # a scan window done
+        try:
+            log(INFO, "\n--- Listening for broadcasts ---")
+            p_scan.hit()
+            # Scans are restarted every STALE_MS so the loop keeps going
+            # round, and feeding the watchdog, through silence
+            async with aioble.scan(STALE_MS, interval_us=30000, window_us=30000, active=False) as scanner:
+                async for result in scanner:
+                    for company, data in result.manufacturer(telemetry.COMPANY_ID):
+                        if not frame.decode_advert(data):
+                            continue
+                        seq = frame.seq
+                        addr = bytes(result.device.addr)
+                        if last_seq.get(addr) == seq:
+                            continue
+                        last_seq[addr] = seq
+                        t_frame.start()
+                        n_frames.inc()
+                        temp = frame.values[0]
+                        threshold = frame.threshold
+                        if stats.level >= DEBUG:
+                            log(DEBUG, "📡 Current:", temp, "| Threshold:", threshold)
+                        if temp != telemetry.INVALID:
+                            sensors.update(addr, seq, temp, threshold, temp >= threshold)
+                            p_frame.hit()
+                        else:
+                            n_no_reading.inc()
+                            sensors.fault(addr)
+                        t_frame.stop()
+                        stats.collect(GC_BUDGET)
         except Exception as e:
-            print(f"Scan error: {e}")
-            await asyncio.sleep(5)
+            log(ERROR, "Scan error:", e)
+            await asyncio.sleep(1)
 
 async def main():
-    await asyncio.gather(ble_receiver(), watch_button())
+    receiver = ble_listener() if TRANSPORT == "broadcast" else find_sensors()
+    asyncio.create_task(stats.console())  # not gathered, a console error can't end the others
+    await asyncio.gather(receiver, watch_button(), supervise())
 
 asyncio.run(main())
@@ -0,0 +1,234 @@
+# Hot-path counters and timers, and level-gated console logging.
+#
+# The same file ships on both boards. Timers and counters are created once
+# at startup; recording only updates small-int attributes, so it does not
+# allocate. log() takes its arguments unformatted and drops them below the
+# current level, so a disabled message costs a call and a compare (plus
+# the argument tuple: hot paths test `level` first).
+#
+# Alloc meters record heap bytes allocated between two marks, from
+# gc.mem_alloc(), to show a loop runs allocation-free. collect() runs an
+# explicit collection at an idle point once the heap has grown by a budget,
+# and the "gc" timer records its pauses. On CPython (the host simulation)
+# there is no gc.mem_alloc(), and alloc meters stay empty.
+#
+# Phase counters hold the ticks_ms, i.e. ms since power-on, at which a
+# startup phase was first reached, so the boot sequence can be tracked in
+# the same report and snapshot. A stats reset leaves them alone.
+#
+# Stats snapshot, as served by the sensor's stats characteristic,
+# little-endian:
+#    0  u8   STATS_V1
+#    1  u8   timer count
+#    2  u8   counter count
+#    3  u8   log level
+#    4  per timer, in creation order: u32 count, u32 min us, u32 max us,
+#       u32 average us
+#       then per counter, in creation order: u32 value
+# The serial command "stats" prints the same numbers with their names.
+
+import gc
+import struct
+import sys
+import time
+import uasyncio as asyncio
+from micropython import const
+
+STATS_V1 = 0xC1
+OFF = const(0)
+ERROR = const(1)
+WARN = const(2)
+INFO = const(3)
+DEBUG = const(4)
+
+level = ERROR  # production default, hot-path messages are INFO and up
+
+_SUM_MAX = const(1 << 28)  # halve the average window before ints get big
+
+timers = []
+counters = []
+_buf = None
+
+try:
+    mem_alloc = gc.mem_alloc
+except AttributeError:
+    mem_alloc = None
+
+
+def log(lvl, *args):
+    if lvl <= level:
+        print(*args)
+
+
+class Timer:
+    def __init__(self, name, unit="us"):
+        self.name = name
+        self.unit = unit
+        self.t0 = 0
+        self.reset()
+        timers.append(self)
+
+    def reset(self):
+        self.count = 0
+        self.min = 0
+        self.max = 0
+        self.sum = 0  # over the last n samples, for the average
+        self.n = 0
+
+    def start(self):
+        self.t0 = time.ticks_us()
+
+    def stop(self):
+        self.add(time.ticks_diff(time.ticks_us(), self.t0))
+
+    def add(self, us):
+        self.count += 1
+        if us < self.min or self.count == 1:
+            self.min = us
+        if us > self.max:
+            self.max = us
+        self.sum += us
+        self.n += 1
+        if self.sum > _SUM_MAX:
+            self.sum >>= 1
+            self.n >>= 1
+
+    def avg(self):
+        return self.sum // self.n if self.n else 0
+
+
+class Alloc(Timer):
+    # Bytes allocated from start() to stop(), or from one mark() to the
+    # next. A collection in between shrinks mem_alloc(), and that interval
+    # is skipped.
+    def __init__(self, name):
+        super().__init__(name, "B")
+        self.t0 = -1
+
+    def start(self):
+        if mem_alloc is not None:
+            self.t0 = mem_alloc()
+
+    def stop(self):
+        if mem_alloc is not None and self.t0 >= 0:
+            n = mem_alloc() - self.t0
+            if n >= 0:
+                self.add(n)
+
+    def mark(self):
+        self.stop()
+        self.start()
+
+
+class Counter:
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+        counters.append(self)
+
+    def inc(self, n=1):
+        self.value += n
+
+    def reset(self):
+        self.value = 0
+
+
+class Phase(Counter):
+    def __init__(self, name):
+        super().__init__(name)
+        self.done = False
+
+    def hit(self):
+        if not self.done:
+            self.done = True
+            self.value = time.ticks_ms()
+            log(INFO, "Boot:", self.name, self.value, "ms")
+
+    def reset(self):
+        pass
+
+
+gc_timer = Timer("gc")
+_gc_base = 0
+
+
+def collect(budget):
+    # At an idle point: collect once budget bytes were allocated since the
+    # last collection, so automatic ones (at gc.threshold) stay rare
+    global _gc_base
+    if mem_alloc is None or mem_alloc() - _gc_base < budget:
+        return
+    gc_timer.start()
+    gc.collect()
+    gc_timer.stop()
+    _gc_base = mem_alloc()
+
+
+def threshold(nbytes):
+    # Automatic collection after nbytes, as a backstop for collect()
+    if hasattr(gc, "threshold"):
+        gc.threshold(nbytes)
+
+
+def reset():
+    for t in timers:
+        t.reset()
+    for c in counters:
+        c.reset()
+
+
+def pack():
+    # Snapshot into one buffer, allocated on the first call
+    global _buf
+    if _buf is None:
+        _buf = bytearray(4 + 16 * len(timers) + 4 * len(counters))
+    buf = _buf
+    struct.pack_into("<BBBB", buf, 0, STATS_V1, len(timers), len(counters), level)
+    i = 4
+    for t in timers:
+        struct.pack_into("<IIII", buf, i, t.count & 0xffffffff, t.min, t.max, t.avg())
+        i += 16
+    for c in counters:
+        struct.pack_into("<I", buf, i, c.value & 0xffffffff)
+        i += 4
+    return buf
+
+
+def report():
+    for t in timers:
+        u = t.unit
+        print(f"{t.name}: n={t.count} min={t.min}{u} max={t.max}{u} avg={t.avg()}{u}")
+    for c in counters:
+        print(f"{c.name}: {c.value}")
+
+
+def command(line):
+    global level
+    words = line.split()
+    if not words:
+        return
+    cmd = words[0]
+    if cmd == b"stats":
+        report()
+    elif cmd == b"reset":
+        reset()
+        print("stats reset")
+    elif cmd == b"log" and len(words) == 2 and words[1].isdigit():
+        level = int(words[1])
+        print("log level", level)
+    else:
+        print("commands: stats | reset | log <0-4>")
+
+
+# Serial commands: "stats", "reset", "log <level 0-4>". Lines are compared
+# as bytes, and a line that still fails is logged and dropped: the console
+# runs as its own task, outside the boards' gathered ones, and must not end.
+async def console():
+    reader = asyncio.StreamReader(sys.stdin)
+    while True:
+        try:
+            line = await reader.readline()
+            command(line)
+        except Exception as e:
+            log(ERROR, "Console error:", e)
+            await asyncio.sleep_ms(100)
@@ -0,0 +1,268 @@
+# Telemetry frames carried by the temperature characteristic.
+#
+# The same file ships on both boards: the sensor builds frames, the valve
+# controller decodes them.
+#
+# Legacy frame: struct "<ff" (temp F, threshold F), exactly 8 bytes.
+#
+# Batched frame, version 1, little-endian:
+#    0  u8   FRAME_V1
+#    1  u8   sequence number
+#    2  u16  ticks_ms of the first sample (wraps)
+#    4  u16  sample period, ms
+#    6  i16  threshold, centi-degrees F
+#    8  u8   probe count
+#    9  u8   samples per probe
+#   10  per probe: i16 first sample in centi-degrees F, then one i8 delta
+#       per further sample. A delta of ESCAPE is followed by a full i16
+#       value, and INVALID marks a failed reading.
+# The header alone is 10 bytes, so a batched frame is never 8 bytes long.
+#
+# Broadcast mode puts the latest reading in manufacturer-specific
+# advertising data instead (company COMPANY_ID), little-endian:
+#    0  u8   ADVERT_V1
+#    1  u8   rolling sequence number
+#    2  i16  hottest probe, centi-degrees F (INVALID if none read)
+#    4  i16  threshold, centi-degrees F
+
+import struct
+import time
+
+FRAME_V1 = 0xA1
+HEADER = "<BBHHhBB"
+HEADER_LEN = 10
+LEGACY_LEN = 8
+ESCAPE = -128
+INVALID = -32768
+ADVERT_V1 = 0xB1
+ADVERT = "<BBhh"
+ADVERT_LEN = 6
+COMPANY_ID = 0xFFFF  # reserved for testing
+
+
+def centi(temp):
+    if temp is None:
+        return INVALID
+    v = int(round(temp * 100))
+    return max(-32767, min(32767, v))
+
+
+def centi_f(raw):
+    # DS18x20 sixteenths of a degree C to centi-degrees F, integer only:
+    # raw / 16 * 1.8 * 100 + 3200 = raw * 45 / 4 + 3200, rounded half up.
+    # The probe's range (-55..125 C) stays well inside an i16.
+    if raw is None:
+        return INVALID
+    return (raw * 45 + 2 >> 2) + 3200
+
+
+class FrameBuilder:
+    """
+    Batches samples, in centi-degrees F, into frames. Sample storage and the frame buffer are
+    allocated for the probe count of the first frame and reused until it
+    grows, so adding samples and building frames doesn't allocate. The
+    frame handed to send() is a view of that buffer, valid until the next
+    one is built. When even a single sample of every probe doesn't fit in
+    max_len, frames carry the hottest probes that do, hottest first, and
+    the rest are counted in overflow.
+    """
+
+    def __init__(self, send, max_len=20, max_samples=4, max_age_ms=0, overflow=None):
+        self.send = send  # called with each finished frame
+        self.max_len = max_len  # negotiated MTU - 3
+        self.max_samples = max_samples
+        self.max_age_ms = max_age_ms  # no sample waits longer than this, 0 = no limit
+        self.seq = 0
+        self.n = 0  # samples in the open frame
+        self.probes = 0  # values per sample in the open frame
+        self.rows = []  # centi values, sample after sample
+        self.buf = bytearray(0)
+        self.views = []  # memoryview of buf per frame length, made on first use
+        self.t0 = 0
+        self.last = 0
+        self.threshold = 0
+        self.overflow = overflow  # stats.Counter of probe readings left out
+        self.top = []  # the readings that fit, when not all do
+
+    def worst_len(self, probes, samples):
+        return HEADER_LEN + probes * (2 + 3 * (samples - 1))
+
+    def _reserve(self, probes):
+        need = probes * self.max_samples
+        if len(self.rows) < need:
+            self.rows = [0] * need
+            self.buf = bytearray(self.worst_len(probes, self.max_samples))
+            self.views = [None] * (len(self.buf) + 1)
+
+    def add(self, temps, thr, now_ms):
+        # temps: one value per probe, INVALID for failed readings
+        probes = len(temps)
+        fit = (self.max_len - HEADER_LEN) // 2
+        if probes > fit:
+            temps = self._hottest(temps, fit)
+            probes = fit
+        if self.n and (probes != self.probes or thr != self.threshold
+                       or self.worst_len(probes, self.n + 1) > self.max_len):
+            self.flush()
+        if not self.n:
+            self.t0 = now_ms
+            self.probes = probes
+            self._reserve(probes)
+        # If the next sample, one period from now, would make the first
+        # one older than max_age_ms, this one closes the frame
+        late = self.max_age_ms and time.ticks_diff(now_ms, self.t0) \
+            + time.ticks_diff(now_ms, self.last) > self.max_age_ms
+        self.last = now_ms
+        self.threshold = thr
+        rows = self.rows
+        j = self.n * probes
+        # Anything at or over the threshold goes out immediately
+        urgent = False
+        for v in temps:
+            rows[j] = v
+            j += 1
+            if v != INVALID and v >= thr:
+                urgent = True
+        self.n += 1
+        if urgent or late or self.n >= self.max_samples:
+            self.flush()
+
+    def _hottest(self, temps, fit):
+        # INVALID sorts below every reading, so failed probes are left out first
+        top = self.top
+        top[:] = temps
+        top.sort(reverse=True)
+        del top[fit:]
+        if self.overflow is not None:
+            self.overflow.inc(len(temps) - fit)
+        return top
+
+    def flush(self):
+        if self.n:
+            self.send(self.build())
+
+    def build(self):
+        rows = self.rows
+        probes = self.probes
+        n = self.n
+        period = time.ticks_diff(self.last, self.t0) // (n - 1) if n > 1 else 0
+        buf = self.buf
+        struct.pack_into(HEADER, buf, 0, FRAME_V1, self.seq, self.t0 & 0xffff,
+                         min(period, 0xffff), self.threshold, probes, n)
+        i = HEADER_LEN
+        for p in range(probes):
+            prev = rows[p]
+            struct.pack_into("<h", buf, i, prev)
+            i += 2
+            for s in range(1, n):
+                v = rows[s * probes + p]
+                d = v - prev
+                if v == INVALID or prev == INVALID or not -128 < d < 128:
+                    struct.pack_into("<bh", buf, i, ESCAPE, v)
+                    i += 3
+                else:
+                    struct.pack_into("<b", buf, i, d)
+                    i += 1
+                prev = v
+        self.seq = (self.seq + 1) & 0xff
+        self.n = 0
+        view = self.views[i]
+        if view is None:
+            view = self.views[i] = memoryview(buf)[:i]
+        return view
+
+
+def _i16(data, i):
+    v = data[i] | data[i + 1] << 8
+    return v - 0x10000 if v & 0x8000 else v
+
+
+class Frame:
+    """
+    Reusable decode target on the controller. Readings stay in
+    centi-degrees F as small ints, so decoding a frame doesn't allocate
+    once values has grown to the largest frame seen (legacy frames still
+    unpack two floats).
+    """
+
+    def __init__(self):
+        self.seq = None  # None for legacy frames
+        self.threshold = 0
+        self.values = []  # every sample of every probe, INVALID for failed readings
+        self.n = 0  # entries of values in use
+
+    def _put(self, v):
+        if self.n < len(self.values):
+            self.values[self.n] = v
+        else:
+            self.values.append(v)
+        self.n += 1
+
+    def decode(self, data):
+        # Either frame format; False for anything that is not a valid frame
+        self.n = 0
+        if len(data) == LEGACY_LEN:
+            temp, threshold = struct.unpack("<ff", data)
+            self.seq = None
+            self.threshold = centi(threshold)
+            self._put(centi(temp))
+            return True
+        end = len(data)
+        if end < HEADER_LEN or data[0] != FRAME_V1:
+            return False
+        self.seq = data[1]
+        self.threshold = _i16(data, 6)
+        probes = data[8]
+        n = data[9]
+        i = HEADER_LEN
+        for p in range(probes):
+            if i + 2 > end:
+                return False  # truncated
+            v = _i16(data, i)
+            i += 2
+            self._put(v)
+            for s in range(1, n):
+                if i >= end:
+                    return False
+                d = data[i]
+                i += 1
+                if d == ESCAPE & 0xff:
+                    if i + 2 > end:
+                        return False
+                    v = _i16(data, i)
+                    i += 2
+                else:
+                    v += d - 256 if d & 0x80 else d
+                self._put(v)
+        return True
+
+    def decode_advert(self, data):
+        # Broadcast manufacturer data as a one-sample frame; False if not ours
+        self.n = 0
+        if len(data) != ADVERT_LEN or data[0] != ADVERT_V1:
+            return False
+        self.seq = data[1]
+        self.threshold = _i16(data, 4)
+        self._put(_i16(data, 2))
+        return True
+
+
+def advert_data(name, seq, temp, threshold):
+    # Flags, complete local name, then the manufacturer-specific reading,
+    # temperatures in centi-degrees F
+    payload = bytearray(b"\x02\x01\x06")
+    payload += bytes((len(name) + 1, 0x09)) + name.encode()
+    payload += bytes((ADVERT_LEN + 3, 0xff)) + struct.pack("<H", COMPANY_ID)
+    payload += struct.pack(ADVERT, ADVERT_V1, seq & 0xff, temp, threshold)
+    return payload
+
+
+class Advert:
+    # Broadcast payload, built once; fill() rewrites the reading in place
+    def __init__(self, name):
+        self.buf = advert_data(name, 0, INVALID, 0)
+        self.at = len(self.buf) - ADVERT_LEN
+
+    def fill(self, seq, temp, threshold):
+        struct.pack_into(ADVERT, self.buf, self.at, ADVERT_V1, seq & 0xff, temp, threshold)
+        return self.buf
@@ -0,0 +1,72 @@
+# Valve state machine.
+#
+#   OPEN           water flows, every reading is checked
+#   TRIPPED        a reading reached its threshold, latched until reset
+#   RESET_PENDING  reset pressed while tripped: the valve opens at once
+#                  and the next reading either confirms it (OPEN) or
+#                  trips it again
+#   FAILSAFE       no valid reading within the staleness deadline, or a
+#                  frame could not be decoded: the valve is closed, or
+#                  held as it was, until a valid reading arrives. A trip
+#                  latched before the failsafe is still latched after it.
+#
+# The relay pin is only written when the state changes, and every change
+# is logged with its ticks_ms timestamp.
+
+import time
+from stats import log, WARN, INFO
+
+OPEN = "OPEN"
+TRIPPED = "TRIPPED"
+RESET_PENDING = "RESET_PENDING"
+FAILSAFE = "FAILSAFE"
+
+
+class ValveState:
+    def __init__(self, pin, failsafe_level=None, trips=None):
+        self.pin = pin  # relay, high closes the valve
+        # Relay level per state, None holds the current one
+        self.levels = {OPEN: 0, TRIPPED: 1, RESET_PENDING: 0, FAILSAFE: failsafe_level}
+        self.trips = trips  # stats.Counter bumped on every trip
+        self.state = OPEN
+        self.level = 0
+        self.latched = False
+        self.since = time.ticks_ms()
+        pin.value(0)
+
+    def _enter(self, state, why):
+        if state == self.state:
+            return
+        now = time.ticks_ms()
+        log(WARN if state in (TRIPPED, FAILSAFE) else INFO,
+            "Valve", self.state, "->", state, "at", now, "ms:", why)
+        level = self.levels[state]
+        if level is not None and level != self.level:
+            self.pin.value(level)
+            self.level = level
+        self.state = state
+        self.since = now
+        if state == TRIPPED:
+            if not self.latched and self.trips is not None:
+                self.trips.inc()
+            self.latched = True
+
+    def reading(self, over):
+        # A valid reading; over is True if it reached the threshold
+        if over:
+            self._enter(TRIPPED, "over threshold")
+        elif self.latched:
+            self._enter(TRIPPED, "still latched")
+        else:
+            self._enter(OPEN, "below threshold")
+
+    def fault(self, why):
+        self._enter(FAILSAFE, why)
+
+    def reset(self):
+        # Reset button; only a latched trip has anything to reset
+        if self.state == TRIPPED:
+            self.latched = False
+            self._enter(RESET_PENDING, "reset pressed")
+        else:
+            log(INFO, "Reset ignored in", self.state)
@@ -0,0 +1,77 @@
+"""
+Big-digit render cost: per-pixel drawing vs pre-rendered glyph blits.
+
+Uses the pure-Python framebuf from sim/, so absolute host times are far
+slower than the native module on the board. What carries over is the
+number of interpreted FrameBuffer calls per frame, which is where the
+per-pixel renderer spent its time on the device.
+
+    python bench/bench_glyphs.py [frames]
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"),
+                os.path.join(ROOT, "Temperature Sensor (TRANSMIT)")]
+
+import framebuf  # noqa: E402
+import bigfont  # noqa: E402
+
+TEXT = "112F"
+
+
+# The renderer bigfont replaced, kept here as the baseline
+def draw_huge_digit(oled, char, x, y):
+    pattern = bigfont.DIGITS.get(char, [" "] * 5)
+    for row in range(5):
+        for col in range(5):
+            if pattern[row][col] == "#":
+                for dx in range(3):
+                    for dy in range(3):
+                        oled.pixel(x + col * 4 + dx, y + row * 6 + dy, 1)
+
+
+def draw_pixels(oled, text, x, y):
+    for i, char in enumerate(text):
+        draw_huge_digit(oled, char, x + i * 24, y)
+
+
+class Counting:
+    def __init__(self, fb):
+        self.fb = fb
+        self.calls = 0
+
+    def pixel(self, *args):
+        self.calls += 1
+        return self.fb.pixel(*args)
+
+    def blit(self, *args):
+        self.calls += 1
+        return self.fb.blit(*args)
+
+
+def bench(name, draw, frames):
+    fb = framebuf.FrameBuffer(bytearray(1024), 128, 64, framebuf.MONO_VLSB)
+    counter = Counting(fb)
+    draw(counter, TEXT, 0, 20)
+    start = time.perf_counter()
+    for _ in range(frames):
+        draw(fb, TEXT, 0, 20)
+    wall = (time.perf_counter() - start) / frames
+    print("%-8s %5d calls/frame  host %8.1f us/frame"
+          % (name, counter.calls, wall * 1e6))
+    return bytes(fb._buf)
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    old = bench("pixel", draw_pixels, frames)
+    new = bench("blit", bigfont.draw_huge_text, frames)
+    print("identical output:", old == new)
+
+
+if __name__ == "__main__":
+    main()
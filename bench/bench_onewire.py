@@ -0,0 +1,58 @@
+"""
+Scratchpad-read cost: bit-banged OneWire vs the UART backend.
+
+Runs both drivers against the simulated DS18B20 bus and reports, per
+9-byte scratchpad read, the bus time (virtual us spent in sleep_us or on
+the UART wire), how many times IRQs were disabled, and host wall time.
+Host wall time only compares interpreter work; on the board the
+bit-banged bus time also grows by the Python overhead of every slot.
+
+    python bench/bench_onewire.py [reads]
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"),
+                os.path.join(ROOT, "Temperature Sensor (TRANSMIT)")]
+
+import machine  # noqa: E402
+from vclock import clock  # noqa: E402
+from onewire_bus import DS18B20, OneWireBus, make_rom  # noqa: E402
+import ds18x20  # noqa: E402
+from onewire import OneWire  # noqa: E402
+from onewire_uart import OneWireUART  # noqa: E402
+
+
+def bench(name, make_ow, reads):
+    bus = OneWireBus([DS18B20(make_rom(1), temp=43.5)])
+    machine.disconnect_all()
+    machine.connect("pin", 2, bus)
+    machine.connect("uart", 1, bus)
+    ds = ds18x20.DS18X20(make_ow())
+    rom = bus.devices[0].rom
+    assert ds.read_temp(rom) is not None, name + ": no reading"
+
+    irqs = machine.irq_disables
+    bus_us = clock.us
+    start = time.perf_counter()
+    for _ in range(reads):
+        ds.read_scratch(rom)
+    wall = time.perf_counter() - start
+    bus_us = (clock.us - bus_us) / reads
+    irqs = (machine.irq_disables - irqs) / reads
+    print("%-10s bus %7.0f us  irq-off %5.0f  host %7.1f us  per read"
+          % (name, bus_us, irqs, wall * 1e6 / reads))
+    return bus_us
+
+
+def main():
+    reads = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    bench("bit-bang", lambda: OneWire(machine.Pin(2)), reads)
+    bench("uart", lambda: OneWireUART(machine.UART(1)), reads)
+
+
+if __name__ == "__main__":
+    main()
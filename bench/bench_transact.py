@@ -0,0 +1,104 @@
+"""
+Scratchpad reads before and after OneWire.transact().
+
+"before" is the previous driver path, kept here as the baseline: a reset
+in DS18X20.read_scratch plus another in select_rom, an IRQ-off section per
+bit and the two-nibble-table CRC. "after" is the current DS18X20 on
+transact(): one reset, one IRQ-off section per byte, 256-entry table CRC.
+
+Bus time and IRQ-off counts come from the simulated bus and carry over to
+the board. Host wall time only compares interpreter work under CPython;
+the viper CRC only kicks in on the board.
+
+    python bench/bench_transact.py [reads]
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"),
+                os.path.join(ROOT, "Temperature Sensor (TRANSMIT)")]
+
+import machine  # noqa: E402
+from vclock import clock  # noqa: E402
+from onewire_bus import DS18B20, OneWireBus, make_rom  # noqa: E402
+import ds18x20  # noqa: E402
+from onewire import OneWire  # noqa: E402
+
+
+class LegacyOneWire(OneWire):
+    crctab1 = (b"\x00\x5E\xBC\xE2\x61\x3F\xDD\x83"
+               b"\xC2\x9C\x7E\x20\xA3\xFD\x1F\x41")
+    crctab2 = (b"\x00\x9D\x23\xBE\x46\xDB\x65\xF8"
+               b"\x8C\x11\xAF\x32\xCA\x57\xE9\x74")
+
+    def readbyte(self):
+        value = 0
+        for i in range(8):
+            value |= self.readbit() << i
+        return value
+
+    def writebyte(self, value, powerpin=None):
+        for i in range(7):
+            self.writebit(value & 1)
+            value >>= 1
+        self.writebit(value & 1, powerpin)
+
+    def crc8(self, data):
+        crc = 0
+        for i in range(len(data)):
+            crc ^= data[i]
+            crc = (self.crctab1[crc & 0x0f] ^
+                   self.crctab2[(crc >> 4) & 0x0f])
+        return crc
+
+
+class LegacyDS18X20(ds18x20.DS18X20):
+    def read_scratch(self, rom):
+        self.ow.reset()
+        self.ow.select_rom(rom)
+        self.ow.writebyte(ds18x20.CMD_RDSCRATCH)
+        self.ow.readinto(self.buf)
+        assert self.ow.crc8(self.buf) == 0, 'CRC error'
+        return self.buf
+
+
+def bench(name, ow_class, ds_class, reads):
+    bus = OneWireBus([DS18B20(make_rom(1), temp=43.5)])
+    machine.disconnect_all()
+    machine.connect("pin", 2, bus)
+    ds = ds_class(ow_class(machine.Pin(2)))
+    rom = bus.devices[0].rom
+    assert ds.read_temp(rom) is not None, name + ": no reading"
+
+    irqs = machine.irq_disables
+    resets = bus.resets
+    bus_us = clock.us
+    start = time.perf_counter()
+    for _ in range(reads):
+        ds.read_scratch(rom)
+    wall = time.perf_counter() - start
+    bus_us = (clock.us - bus_us) / reads
+    irqs = (machine.irq_disables - irqs) / reads
+    resets = (bus.resets - resets) / reads
+
+    buf = ds.buf
+    crc8 = ds.ow.crc8
+    start = time.perf_counter()
+    for _ in range(reads):
+        crc8(buf)
+    crc_us = (time.perf_counter() - start) * 1e6 / reads
+    print("%-7s bus %6.0f us  resets %.0f  irq-off %4.0f  host %6.1f us  crc %5.2f us  per read"
+          % (name, bus_us, resets, irqs, wall * 1e6 / reads, crc_us))
+
+
+def main():
+    reads = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    bench("before", LegacyOneWire, LegacyDS18X20, reads)
+    bench("after", OneWire, ds18x20.DS18X20, reads)
+
+
+if __name__ == "__main__":
+    main()
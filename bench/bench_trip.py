@@ -0,0 +1,302 @@
+"""
+End-to-end trip latency: water over the threshold -> valve relay closed.
+
+Each trial boots both firmware images in the host simulation (sim/run.py),
+lets the receiver connect, then steps the water temperature over the
+threshold at a random phase of the sensor's sample loop (or ramps it
+through at --ramp F/s) and times the relay edge; with a predictive early
+trip the latency can be negative. The trip is traced back through the sensor loop iteration
+and the frame that caused it, giving a per-stage breakdown:
+
+    wait        crossing -> next conversion latches the new temperature
+    conversion  convert command -> conversion done
+    scratchpad  scratchpad reads of every probe
+    publish     sample ready -> frame sent (LEDs, frame building)
+    notify      frame built and sent -> decoded on the receiver (BLE events)
+    receive     decode -> valve.value() call
+    actuate     valve.value() -> relay pin edge
+
+Times are virtual (the sim clock), so results are deterministic for a seed
+and comparable between builds; host speed does not enter into them. Only
+blocking I/O (1-Wire slots, I2C transfers) and awaited time advance the
+clock: interpreter time is not modeled, so publish and receive read ~0 here
+and are best cross-checked with timings on the board.
+
+    python bench/bench_trip.py [--trials 50] [--transport broadcast]
+                               [--margin 3] [--ramp 1.0] [--predict-ms 500]
+                               [--drop-ms 200] [--json out.json]
+                               [--baseline old.json]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim")]
+
+import air  # noqa: E402
+import run  # noqa: E402
+from vclock import clock  # noqa: E402
+
+STAGES = ("wait", "conversion", "scratchpad", "publish", "notify", "receive", "actuate")
+SETTLE_S = 3.0  # boot, scan and connect before the first crossing
+TIMEOUT_S = 20.0  # give up on a trial this long after the crossing
+
+
+def f_to_c(f):
+    return (f - 32) / 1.8
+
+
+class Trace:
+    """Timestamps from wrappers around the firmware's own objects."""
+
+    def __init__(self, sensor, valve):
+        self.cycles = []  # one dict per sensor loop iteration
+        self.shows = []  # (start, end) of every OLED transfer
+        self.stall_us = 0  # longest the OLED blocked the event loop in one go
+        self.rx = None  # (us, data) of the last frame decoded by the receiver
+        self.actuated = None  # (us, rx) of the first valve.value(True)
+        self._sensor(sensor)
+        self._valve(valve)
+
+    def _mark(self, key, value=None):
+        if self.cycles:
+            self.cycles[-1][key] = clock.us if value is None else value
+
+    def _sensor(self, m):
+        ds, sampler, panel = m.ds, m.sampler, m.SSD1306_I2C  # the OLED is set up lazily
+        convert, wait, sample = ds.convert_temp, sampler.wait_conversion, sampler.sample
+        show, show_async = panel.show, panel.show_async
+        write, broadcast = m.temp_characteristic.write, m.broadcast
+
+        def convert_temp(rom=None):
+            convert(rom)
+            # The probe latched the water temperature with the command
+            self.cycles.append({"latch": clock.us})
+
+        async def wait_conversion():
+            await wait()
+            self._mark("converted")
+
+        async def sample_():
+            temps = await sample()
+            self._mark("read")
+            return temps
+
+        def show_(oled, *args, **kwargs):
+            t0 = clock.us
+            show(oled, *args, **kwargs)
+            self.shows.append((t0, clock.us))
+            self.stall_us = max(self.stall_us, clock.us - t0)
+
+        async def show_async_(oled, *args, **kwargs):
+            t0 = clock.us
+            await show_async(oled, *args, **kwargs)
+            self.shows.append((t0, clock.us))
+            self.stall_us = max(self.stall_us, oled.page_us)
+
+        def write_(data, send_update=False):
+            self._mark("sent")
+            self._mark("payload", bytes(data))
+            write(data, send_update)
+
+        def broadcast_(temp, threshold):
+            broadcast(temp, threshold)
+            self._mark("sent")
+            self._mark("payload", bytes(m.advert.buf))
+
+        ds.convert_temp = convert_temp
+        sampler.wait_conversion = wait_conversion
+        sampler.sample = sample_
+        panel.show = show_
+        panel.show_async = show_async_
+        m.temp_characteristic.write = write_
+        m.broadcast = broadcast_
+
+    def _valve(self, m):
+        frame, pin = m.frame, m.valve
+        decode, decode_advert, value = frame.decode, frame.decode_advert, pin.value
+
+        def decode_(data):
+            self.rx = (clock.us, bytes(data))
+            return decode(data)
+
+        def decode_advert_(data):
+            self.rx = (clock.us, bytes(data))
+            return decode_advert(data)
+
+        def value_(v=None):
+            if v and self.actuated is None:
+                self.actuated = (clock.us, self.rx)
+            return value(v)
+
+        frame.decode = decode_
+        frame.decode_advert = decode_advert_
+        pin.value = value_
+
+    def stages(self, crossed, edge):
+        # Follow the frame that tripped the valve back to its loop iteration
+        if self.actuated is None or self.actuated[1] is None:
+            return None
+        act_t, (rx_t, data) = self.actuated
+        for c in reversed(self.cycles):
+            if c.get("sent", rx_t + 1) <= rx_t and c["payload"].endswith(data):
+                break
+        else:
+            return None
+        if c["latch"] < crossed:
+            return None
+        marks = (crossed, c["latch"], c["converted"], c["read"], c["sent"], rx_t, act_t, edge)
+        return dict(zip(STAGES, ((b - a) / 1000 for a, b in zip(marks, marks[1:]))))
+
+
+def trial(rng, transport, drop_ms, margin=3.0, ramp=0.0, predict_ms=0):
+    world, rig = run.build()
+    sensor, valve = rig["sensor"], rig["valve"]
+    for n in world.nodes:
+        n.quiet = True
+        n.load().TRANSPORT = transport
+    m = sensor.module
+    m.scheduler.predict_ms = predict_ms
+    threshold = m.map_value(rig["knob"].raw, m.OBSERVED_MIN, m.OBSERVED_MAX,
+                            m.THRESHOLD_MIN, m.THRESHOLD_MAX)
+    for p in rig["probes"]:
+        p.temp = f_to_c(threshold - margin)
+    trace = Trace(m, valve.module)
+    rig["relay"].on_change = lambda level: world.stop()
+    crossed = []
+    lead_us = int(margin / ramp * 1e6) if ramp else 0
+    cross_at = clock.us + lead_us + int((SETTLE_S + rng.random()) * 1e6)
+
+    async def heat():
+        # Linear rise through the threshold, timed off the clock
+        while True:
+            f = threshold + (clock.us - cross_at) * ramp / 1e6
+            for p in rig["probes"]:
+                p.temp = f_to_c(max(threshold - margin, min(f, threshold + 2)))
+            if f >= threshold + 2:
+                return
+            await asyncio.sleep(0.01)
+
+    async def step():
+        if drop_ms:
+            await asyncio.sleep((cross_at - drop_ms * 1000 - clock.us) / 1e6)
+            for link in list(air.links):
+                link.close()
+        if ramp:
+            await asyncio.sleep((cross_at - lead_us - clock.us) / 1e6)
+            crossed.append(cross_at)
+            await heat()
+            return
+        await asyncio.sleep((cross_at - clock.us) / 1e6)
+        for p in rig["probes"]:
+            p.temp = f_to_c(threshold + 2)
+        # Blocking driver code can hold the loop past cross_at, so the
+        # crossing is timed from when it actually happened
+        crossed.append(clock.us)
+
+    start = clock.us
+    world.run(SETTLE_S + 1 + lead_us / 1e6 + TIMEOUT_S, step())
+    edge = rig["relay"].first(1)
+    result = {
+        "samples_per_s": m.sampler.count / ((clock.us - start) / 1e6),
+        "frames_per_s": len(trace.shows) / ((clock.us - start) / 1e6),
+        "oled_stall_ms": trace.stall_us / 1000,
+        "trip_ms": None,
+        "stages": None,
+    }
+    if crossed and edge is not None:
+        result["trip_ms"] = (edge - crossed[0]) / 1000
+        result["stages"] = trace.stages(crossed[0], edge)
+    return result
+
+
+def percentile(values, p):
+    # Nearest rank
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summary(values):
+    if not values:
+        return None
+    return {
+        "p50": percentile(values, 50),
+        "p99": percentile(values, 99),
+        "max": max(values),
+        "mean": sum(values) / len(values),
+    }
+
+
+def compare(report, baseline):
+    print("\nvs baseline (ms, negative is faster):")
+    rows = [("trip", report["trip_ms"], baseline.get("trip_ms"))]
+    for stage in STAGES:
+        rows.append((stage, report["stages_ms"].get(stage),
+                     baseline.get("stages_ms", {}).get(stage)))
+    for name, new, old in rows:
+        if not new or not old:
+            continue
+        print("  %-11s p50 %+9.1f  p99 %+9.1f  max %+9.1f" % (
+            name, new["p50"] - old["p50"], new["p99"] - old["p99"], new["max"] - old["max"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end trip latency in the host simulation")
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--transport", choices=("gatt", "broadcast"), default="gatt")
+    parser.add_argument("--margin", type=float, default=3.0,
+                        help="F below the threshold the water starts at")
+    parser.add_argument("--ramp", type=float, default=0.0,
+                        help="rise through the threshold in F/s, 0 steps it")
+    parser.add_argument("--predict-ms", type=int, default=0,
+                        help="sensor's predictive early-trip horizon")
+    parser.add_argument("--drop-ms", type=int, default=0,
+                        help="drop the BLE link this long before each crossing")
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--baseline", help="earlier --json report to compare against")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = [trial(rng, args.transport, args.drop_ms, args.margin, args.ramp, args.predict_ms)
+               for _ in range(args.trials)]
+    trips = [r["trip_ms"] for r in results if r["trip_ms"] is not None]
+    traced = [r["stages"] for r in results if r["stages"]]
+    report = {
+        "transport": args.transport,
+        "drop_ms": args.drop_ms,
+        "margin": args.margin,
+        "ramp": args.ramp,
+        "predict_ms": args.predict_ms,
+        "trials": args.trials,
+        "seed": args.seed,
+        "missed": args.trials - len(trips),
+        "samples_per_s": sum(r["samples_per_s"] for r in results) / len(results),
+        "frames_per_s": sum(r["frames_per_s"] for r in results) / len(results),
+        "oled_stall_ms": max(r["oled_stall_ms"] for r in results),
+        "trip_ms": summary(trips),
+        "stages_ms": {s: summary([t[s] for t in traced]) for s in STAGES},
+    }
+
+    print("%d trials, %s, %d missed, %.2f samples/s, %.2f OLED frames/s, OLED stall max %.1f ms" % (
+        args.trials, args.transport, report["missed"], report["samples_per_s"],
+        report["frames_per_s"], report["oled_stall_ms"]))
+    for name, s in [("trip", report["trip_ms"])] + list(report["stages_ms"].items()):
+        if s:
+            print("  %-11s p50 %9.1f  p99 %9.1f  max %9.1f ms" % (name, s["p50"], s["p99"], s["max"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+"""
+Host stand-in for aioble, one copy per node, talking over sim/air.py.
+
+Covers the parts the firmware uses: GATT server services and
+characteristics with notify, advertise(), scan(), Device.connect(),
+DeviceConnection (MTU exchange, discovery, disconnect), the client
+classes in aioble.client, and the IRQ handler chain in aioble.core.
+"""
+
+import asyncio
+import sys
+
+import air
+import board
+import bluetooth
+from aioble import core
+from vclock import clock
+
+_node = board.node()
+
+_ADV_FLAGS = 0x01
+_ADV_UUID16_COMPLETE = 0x03
+_ADV_UUID128_COMPLETE = 0x07
+_ADV_NAME_SHORT = 0x08
+_ADV_NAME_COMPLETE = 0x09
+_ADV_APPEARANCE = 0x19
+_ADV_MANUFACTURER = 0xff
+_IRQ_CONNECTION_UPDATE = 27
+
+
+class DeviceDisconnectedError(Exception):
+    pass
+
+
+class GattError(Exception):
+    pass
+
+
+def config(*args, **kwargs):
+    return bluetooth.BLE().config(*args, **kwargs)
+
+
+def _my_addr():
+    return _node.addr if _node else bytes(6)
+
+
+def _append(data, ad_type, value):
+    data += bytes((len(value) + 1, ad_type)) + value
+
+
+def _ad_fields(data):
+    i = 0
+    while i + 1 < len(data):
+        n = data[i]
+        if n == 0:
+            break
+        yield data[i + 1], data[i + 2:i + 1 + n]
+        i += 1 + n
+
+
+# Peripheral side
+
+
+class Service:
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self.characteristics = []
+        self.handle = None
+        self.end_handle = None
+
+
+class Characteristic:
+    def __init__(self, service, uuid, read=False, write=False,
+                 write_no_response=False, notify=False, indicate=False,
+                 initial=None, capture=False):
+        service.characteristics.append(self)
+        self.service = service
+        self.uuid = uuid
+        self.properties = ((bluetooth.FLAG_READ if read else 0)
+                           | (bluetooth.FLAG_WRITE if write else 0)
+                           | (bluetooth.FLAG_WRITE_NO_RESPONSE if write_no_response else 0)
+                           | (bluetooth.FLAG_NOTIFY if notify else 0)
+                           | (bluetooth.FLAG_INDICATE if indicate else 0))
+        self._value = bytes(initial or b"")
+        self._value_handle = None
+        self._end_handle = None
+        self._cccd_handle = None
+        self._subscribers = []
+        self._written = asyncio.Event() if write else None
+
+    def read(self):
+        return self._value
+
+    def write(self, data, send_update=False):
+        self._value = bytes(data)
+        if send_update:
+            for conn in list(self._subscribers):
+                if conn.is_connected():
+                    conn._link.deliver(self._value_handle, self._value)
+                else:
+                    self._subscribers.remove(conn)
+
+    def notify(self, connection, data=None):
+        if data is not None:
+            self._value = bytes(data)
+        connection._link.deliver(self._value_handle, self._value)
+
+
+class BufferedCharacteristic(Characteristic):
+    def __init__(self, *args, max_len=20, append=False, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+_services = []
+_by_handle = {}
+
+
+def register_services(*services):
+    # Same layout as the real stack: service, then declaration + value
+    # (+ CCCD) per characteristic
+    handle = 1
+    _services[:] = services
+    _by_handle.clear()
+    for service in services:
+        service.handle = handle
+        for char in service.characteristics:
+            char._value_handle = handle + 2
+            handle += 2
+            if char.properties & (bluetooth.FLAG_NOTIFY | bluetooth.FLAG_INDICATE):
+                handle += 1
+                char._cccd_handle = handle
+            char._end_handle = handle
+            _by_handle[char._value_handle] = char
+        service.end_handle = handle
+        handle += 1
+
+
+def _encode_adv(name=None, services=None, appearance=0, manufacturer=None):
+    data = bytearray()
+    _append(data, _ADV_FLAGS, b"\x06")
+    if name:
+        _append(data, _ADV_NAME_COMPLETE, name.encode())
+    for uuid in services or ():
+        b = bytes(uuid)
+        _append(data, _ADV_UUID16_COMPLETE if len(b) == 2 else _ADV_UUID128_COMPLETE, b)
+    if appearance:
+        _append(data, _ADV_APPEARANCE, appearance.to_bytes(2, "little"))
+    if manufacturer:
+        _append(data, _ADV_MANUFACTURER,
+                manufacturer[0].to_bytes(2, "little") + bytes(manufacturer[1]))
+    return bytes(data)
+
+
+async def advertise(interval_us, adv_data=None, resp_data=None, connect=True,
+                    limited_disc=False, br_edr=False, name=None, services=None,
+                    appearance=0, manufacturer=None, timeout_ms=None):
+    if adv_data is None:
+        adv_data = _encode_adv(name, services, appearance, manufacturer)
+    adv = air.advertise(_node, _my_addr(), bytes(adv_data), bytes(resp_data or b""),
+                        connect, interval_us)
+    if not connect:
+        if timeout_ms:
+            await asyncio.sleep(timeout_ms / 1000)
+            air.stop(_my_addr())
+        return None
+    adv.on_connect = asyncio.get_event_loop().create_future()
+    try:
+        if timeout_ms:
+            return await asyncio.wait_for(adv.on_connect, timeout_ms / 1000)
+        return await adv.on_connect
+    finally:
+        if air.adverts.get(_my_addr()) is adv:
+            air.stop(_my_addr())
+
+
+# Central side
+
+
+class Device:
+    def __init__(self, addr_type, addr):
+        self.addr_type = addr_type
+        self.addr = bytes(addr)
+        self._connection = None
+
+    def __eq__(self, other):
+        return isinstance(other, Device) and self.addr == other.addr
+
+    def __hash__(self):
+        return hash(self.addr)
+
+    def __str__(self):
+        return "Device(ADDR_PUBLIC, %s)" % self.addr_hex()
+
+    def addr_hex(self):
+        return ":".join("%02x" % b for b in self.addr)
+
+    async def connect(self, timeout_ms=10000, scan_duration_ms=None,
+                      min_conn_interval_us=None, max_conn_interval_us=None):
+        deadline = clock.us + timeout_ms * 1000
+        while True:
+            adv = air.adverts.get(self.addr)
+            now = clock.us
+            if adv is not None and adv.connectable and adv.on_connect is not None \
+                    and not adv.on_connect.done() and air.in_range(self.addr):
+                # CONNECT_IND goes out right after the peer's next advert
+                t = adv.next_tx(now)
+                if t > deadline:
+                    await asyncio.sleep((deadline - now) / 1e6)
+                    raise asyncio.TimeoutError
+                await asyncio.sleep((t - now) / 1e6)
+                if air.adverts.get(self.addr) is adv and not adv.on_connect.done():
+                    break
+                continue
+            if now >= deadline:
+                raise asyncio.TimeoutError
+            await asyncio.sleep(min(10_000, deadline - now) / 1e6)
+
+        mtu = 23
+        central = DeviceConnection(Device(0, adv.node.addr if adv.node else self.addr))
+        peripheral = DeviceConnection(Device(0, _my_addr()))
+        link = air.Link(central, peripheral, max_conn_interval_us or min_conn_interval_us, mtu)
+        central._link = link
+        peripheral._link = link
+        central._core = core
+        peripheral._core = adv.node.modules.get("aioble.core") if adv.node else None
+        # The peripheral end serves the peer node's own GATT table
+        peripheral._server_mod = adv.node.modules["aioble"] if adv.node else sys.modules[__name__]
+        adv.on_connect.set_result(peripheral)
+        air.stop(self.addr)
+        await link.wait_event(air.SETUP_EVENTS)
+        self._connection = central
+        return central
+
+
+class DeviceConnection:
+    def __init__(self, device):
+        self.device = device
+        self._link = None
+        self._core = None  # this end's aioble.core, for stack events
+        self._characteristics = {}
+        self._server_mod = None
+        self._disconnected = asyncio.Event()
+        self.encrypted = False
+        self.authenticated = False
+        self.bonded = False
+        self.key_size = False
+
+    @property
+    def mtu(self):
+        return self._link.mtu if self._link else None
+
+    def disconnected_error(self):
+        return DeviceDisconnectedError()
+
+    def is_connected(self):
+        return self._link is not None and self._link.connected
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.disconnect()
+
+    async def disconnect(self, timeout_ms=2000):
+        if self.is_connected():
+            # LL_TERMINATE_IND goes out on the next event; the peer may have
+            # dropped the link first, which is not an error here
+            link = self._link
+            await asyncio.sleep((link.next_event(clock.us + 1) - clock.us) / 1e6)
+            link.close()
+
+    async def disconnected(self, timeout_ms=None, disconnect=False):
+        if disconnect:
+            await self.disconnect()
+        if timeout_ms:
+            await asyncio.wait_for(self._disconnected.wait(), timeout_ms / 1000)
+        else:
+            await self._disconnected.wait()
+
+    @property
+    def _conn_handle(self):
+        return self._link.handle if self._link else None
+
+    def _irq(self, event, data):
+        if self._core is not None:
+            self._core.ble_irq(event, data)
+
+    def _closed(self):
+        self._disconnected.set()
+        for char in self._characteristics.values():
+            char._event.set()
+
+    def _notify(self, handle, data):
+        char = self._characteristics.get(handle)
+        if char is not None and self.is_connected():
+            char._queue = data
+            char._event.set()
+
+    async def exchange_mtu(self, mtu=None, timeout_ms=1000):
+        if mtu:
+            config(mtu=mtu)
+        await self._link.round_trip()
+        self._link.mtu = min(config("mtu"), self._link.peripheral._peer_config("mtu"))
+        return self._link.mtu
+
+    async def service(self, uuid, timeout_ms=2000):
+        from aioble.client import ClientService
+
+        await self._link.round_trip()
+        for service in self._link.peripheral._services():
+            if service.uuid == uuid:
+                return ClientService(self, service.handle, service.end_handle, uuid)
+        return None
+
+    async def services(self, uuid=None, timeout_ms=2000):
+        from aioble.client import ClientService
+
+        await self._link.round_trip()
+        for service in self._link.peripheral._services():
+            if uuid is None or service.uuid == uuid:
+                yield ClientService(self, service.handle, service.end_handle, service.uuid)
+
+    # Peripheral end: expose this node's GATT server to the central
+
+    def _services(self):
+        return self._server_mod._services
+
+    def _char(self, handle):
+        return self._server_mod._by_handle.get(handle)
+
+    def _peer_config(self, key):
+        return self._server_mod.config(key)
+
+    def timeout(self, timeout_ms):
+        return _Timeout(timeout_ms)
+
+    def pair(self, *args, **kwargs):
+        pass
+
+
+class _Timeout:
+    def __init__(self, timeout_ms):
+        self.timeout_ms = timeout_ms
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class ScanResult:
+    def __init__(self, adv):
+        self.device = Device(0, adv.addr)
+        self.adv_data = adv.adv_data
+        self.resp_data = adv.resp_data
+        self.rssi = -50
+        self.connectable = adv.connectable
+
+    def _fields(self):
+        yield from _ad_fields(self.adv_data)
+        yield from _ad_fields(self.resp_data)
+
+    def name(self):
+        for ad_type, value in self._fields():
+            if ad_type in (_ADV_NAME_SHORT, _ADV_NAME_COMPLETE):
+                return bytes(value).decode()
+        return None
+
+    def services(self):
+        for ad_type, value in self._fields():
+            if ad_type in (0x02, _ADV_UUID16_COMPLETE):
+                for i in range(0, len(value), 2):
+                    yield bluetooth.UUID(value[i:i + 2])
+            elif ad_type in (0x06, _ADV_UUID128_COMPLETE):
+                for i in range(0, len(value), 16):
+                    yield bluetooth.UUID(value[i:i + 16])
+
+    def manufacturer(self, filter=None):
+        for ad_type, value in self._fields():
+            if ad_type == _ADV_MANUFACTURER and len(value) >= 2:
+                company = int.from_bytes(value[:2], "little")
+                if filter is None or company == filter:
+                    yield company, bytes(value[2:])
+
+
+class scan:
+    def __init__(self, duration_ms, interval_us=None, window_us=None, active=False):
+        self.duration_ms = duration_ms
+        self.heard = {}  # addr -> time of the last advertising event processed
+        self.seen = {}  # addr -> (advert, version) last reported
+        self._stop = asyncio.Event()  # set by cancel()
+
+    async def __aenter__(self):
+        self.deadline = clock.us + self.duration_ms * 1000 if self.duration_ms else None
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def cancel(self):
+        # Ends the scan from another task; its loop sees no more results
+        self._stop.set()
+
+    async def _sleep(self, us):
+        try:
+            await asyncio.wait_for(self._stop.wait(), us / 1e6)
+        except asyncio.TimeoutError:
+            pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        me = _my_addr()
+        while True:
+            now = clock.us
+            best = None
+            for addr, adv in air.adverts.items():
+                if addr == me or not air.in_range(addr):
+                    continue
+                t = adv.next_tx(max(now, self.heard.get(addr, -1) + 1))
+                if best is None or t < best[0]:
+                    best = (t, adv)
+            t = best[0] if best else now + 100_000
+            if self.deadline is not None and t > self.deadline:
+                await self._sleep(max(0, self.deadline - now))
+                raise StopAsyncIteration
+            await self._sleep(t - now)
+            if self._stop.is_set():
+                raise StopAsyncIteration
+            if best is None:
+                continue
+            adv = best[1]
+            self.heard[adv.addr] = t
+            if air.adverts.get(adv.addr) is not adv:
+                continue
+            key = (id(adv), adv.version)
+            if self.seen.get(adv.addr) == key:
+                continue
+            self.seen[adv.addr] = key
+            return ScanResult(adv)
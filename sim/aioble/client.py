@@ -0,0 +1,82 @@
+"""GATT client classes of the simulated aioble."""
+
+import asyncio
+
+import bluetooth
+
+_CCCD_UUID = bluetooth.UUID(0x2902)
+
+
+class ClientService:
+    def __init__(self, connection, start_handle, end_handle, uuid):
+        self.connection = connection
+        self._start_handle = start_handle
+        self._end_handle = end_handle
+        self.uuid = uuid
+
+    async def characteristic(self, uuid, timeout_ms=2000):
+        link = self.connection._link
+        await link.round_trip()
+        for service in link.peripheral._services():
+            for char in service.characteristics:
+                if char.uuid == uuid and \
+                        self._start_handle <= char._value_handle <= self._end_handle:
+                    return ClientCharacteristic(self, char._end_handle, char._value_handle,
+                                                char.properties, uuid)
+        return None
+
+
+class ClientCharacteristic:
+    def __init__(self, service, end_handle, value_handle, properties, uuid):
+        self.service = service
+        self.connection = service.connection
+        self._end_handle = end_handle
+        self._value_handle = value_handle
+        self.properties = properties
+        self.uuid = uuid
+        self._queue = None
+        self._event = asyncio.Event()
+        self.connection._characteristics[value_handle] = self
+
+    def _server_char(self):
+        return self.connection._link.peripheral._char(self._value_handle)
+
+    async def read(self, timeout_ms=1000):
+        link = self.connection._link
+        await link.round_trip()
+        char = self._server_char()
+        if char is None:
+            raise ValueError("invalid handle")
+        return char.read()
+
+    async def subscribe(self, notify=True, indicate=False):
+        link = self.connection._link
+        await link.round_trip()  # descriptor discovery for the CCCD
+        char = self._server_char()
+        if char is None or char._cccd_handle is None \
+                or not self._value_handle < char._cccd_handle <= self._end_handle:
+            raise ValueError("CCCD not found")
+        await link.round_trip()  # CCCD write
+        if notify or indicate:
+            if link.peripheral not in char._subscribers:
+                char._subscribers.append(link.peripheral)
+        elif link.peripheral in char._subscribers:
+            char._subscribers.remove(link.peripheral)
+
+    async def notified(self, timeout_ms=None):
+        from aioble import DeviceDisconnectedError
+
+        while self._queue is None:
+            if not self.connection.is_connected():
+                raise DeviceDisconnectedError()
+            self._event.clear()
+            if timeout_ms:
+                await asyncio.wait_for(self._event.wait(), timeout_ms / 1000)
+            else:
+                await self._event.wait()
+        data = self._queue
+        self._queue = None
+        return data
+
+    async def indicated(self, timeout_ms=None):
+        return await self.notified(timeout_ms)
@@ -0,0 +1,19 @@
+"""aioble.core of the simulated stack: the IRQ handler chain."""
+
+_irq_handlers = []
+_shutdown_handlers = []
+
+
+def register_irq_handler(irq, shutdown):
+    if irq:
+        _irq_handlers.append(irq)
+    if shutdown:
+        _shutdown_handlers.append(shutdown)
+
+
+def ble_irq(event, data):
+    # Handlers in registration order, the first non-None result wins
+    for handler in _irq_handlers:
+        result = handler(event, data)
+        if result is not None:
+            return result
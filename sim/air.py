@@ -0,0 +1,145 @@
+"""
+Shared radio medium for the simulated BLE stacks of every node.
+
+Advertisers transmit every interval_us from when they started. A link
+carries GATT traffic only on connection events, every interval_us from
+when it was established, so discovery, MTU exchange and notifications all
+pay the connection-interval latency they would on air.
+"""
+
+import asyncio
+
+from vclock import clock
+
+DEFAULT_INTERVAL_US = 30_000
+SETUP_EVENTS = 1  # connection events between CONNECT_IND and a usable link
+
+adverts = {}  # addr -> Advert
+links = []
+shadowed = {}  # addr -> clock.us until which that node is out of range
+_handles = [0]  # last connection handle given out
+_IRQ_CONNECTION_UPDATE = 27
+
+
+class Advert:
+    def __init__(self, node, addr, adv_data, resp_data, connectable, interval_us):
+        self.node = node
+        self.addr = addr
+        self.adv_data = adv_data
+        self.resp_data = resp_data
+        self.connectable = connectable
+        self.interval_us = max(int(interval_us), 20_000)
+        self.start = clock.us
+        self.version = 0
+        self.on_connect = None  # future set by aioble.advertise()
+
+    def next_tx(self, after):
+        # First advertising event at or after `after`
+        if after <= self.start:
+            return self.start
+        k = -(-(after - self.start) // self.interval_us)
+        return self.start + k * self.interval_us
+
+
+def advertise(node, addr, adv_data, resp_data, connectable, interval_us):
+    adv = adverts.get(addr)
+    if adv is not None and adv.interval_us == max(int(interval_us), 20_000) \
+            and adv.connectable == connectable:
+        # Same advertising set, new payload: keep the event schedule
+        adv.adv_data = adv_data
+        adv.resp_data = resp_data
+        adv.version += 1
+        return adv
+    adv = Advert(node, addr, adv_data, resp_data, connectable, interval_us)
+    if addr in adverts:
+        adv.on_connect = adverts[addr].on_connect
+    adverts[addr] = adv
+    return adv
+
+
+def stop(addr):
+    adverts.pop(addr, None)
+
+
+def out_of_range(addr, ms):
+    # The node at addr drops its links and can't be heard or reached for ms
+    shadowed[addr] = clock.us + int(ms * 1000)
+    for link in list(links):
+        if addr in (link.central.device.addr, link.peripheral.device.addr):
+            link.close()
+
+
+def in_range(addr):
+    return clock.us >= shadowed.get(addr, 0)
+
+
+def reset():
+    # Fresh radio for a new World
+    adverts.clear()
+    shadowed.clear()
+    for link in list(links):
+        link.close()
+
+
+class Link:
+    def __init__(self, central, peripheral, interval_us=None, mtu=23):
+        self.central = central  # DeviceConnection at each end
+        self.peripheral = peripheral
+        self.interval_us = int(interval_us or DEFAULT_INTERVAL_US)
+        self.latency = 0
+        self.timeout_ms = 4000
+        self.start = clock.us
+        self.mtu = mtu
+        self.connected = True
+        self.notifies = 0
+        _handles[0] += 1
+        self.handle = _handles[0]
+        links.append(self)
+
+    def next_event(self, after=None):
+        if after is None:
+            after = clock.us
+        k = -(-(after - self.start) // self.interval_us)
+        return self.start + max(k, 0) * self.interval_us
+
+    async def wait_event(self, events=1):
+        t = clock.us
+        for _ in range(events):
+            t = self.next_event(t + 1)
+        await asyncio.sleep((t - clock.us) / 1e6)
+        if not self.connected:
+            raise self.central.disconnected_error()
+
+    async def round_trip(self):
+        # Request on one connection event, response on the next
+        await self.wait_event(2)
+
+    def update(self, interval_us=None, latency=None, timeout_ms=None):
+        # A connection update, reported to both ends' stacks like the
+        # real _IRQ_CONNECTION_UPDATE: interval in 1.25 ms units, timeout
+        # in 10 ms units
+        if interval_us:
+            self.start = self.next_event()
+            self.interval_us = int(interval_us)
+        if latency is not None:
+            self.latency = latency
+        if timeout_ms is not None:
+            self.timeout_ms = timeout_ms
+        data = (self.handle, self.interval_us * 4 // 5000, self.latency, self.timeout_ms // 10, 0)
+        for end in (self.central, self.peripheral):
+            end._irq(_IRQ_CONNECTION_UPDATE, data)
+
+    def deliver(self, handle, data):
+        # Notification queued now, received by the central on the next event
+        self.notifies += 1
+        t = self.next_event(clock.us + 1)
+        loop = asyncio.get_event_loop()
+        loop.call_at(t / 1e6, self.central._notify, handle, bytes(data[:self.mtu - 3]))
+
+    def close(self):
+        if self.connected:
+            self.connected = False
+            if self in links:
+                links.remove(self)
+            self.central._closed()
+            self.peripheral._closed()
@@ -0,0 +1,70 @@
+"""Host stand-in for the MicroPython bluetooth module, one copy per node."""
+
+import air
+import board
+
+FLAG_READ = 0x0002
+FLAG_WRITE_NO_RESPONSE = 0x0004
+FLAG_WRITE = 0x0008
+FLAG_NOTIFY = 0x0010
+FLAG_INDICATE = 0x0020
+
+_node = board.node()
+
+
+class UUID:
+    def __init__(self, value):
+        if isinstance(value, UUID):
+            self._bytes = value._bytes
+        elif isinstance(value, int):
+            self._bytes = value.to_bytes(2, "little")
+        elif isinstance(value, str):
+            self._bytes = bytes.fromhex(value.replace("-", ""))[::-1]
+        else:
+            self._bytes = bytes(value)  # little-endian, as in AD fields
+
+    def __bytes__(self):
+        return self._bytes
+
+    def __eq__(self, other):
+        # Every node has its own copy of this class, so compare by value
+        return getattr(other, "_bytes", None) == self._bytes
+
+    def __hash__(self):
+        return hash(self._bytes)
+
+    def __repr__(self):
+        if len(self._bytes) == 2:
+            return "UUID(0x%04x)" % int.from_bytes(self._bytes, "little")
+        h = self._bytes[::-1].hex()
+        return "UUID('%s-%s-%s-%s-%s')" % (h[:8], h[8:12], h[12:16], h[16:20], h[20:])
+
+
+class BLE:
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._config = {"mtu": 23, "mac": (0, _node.addr if _node else bytes(6))}
+            cls._instance._active = True
+        return cls._instance
+
+    def active(self, value=None):
+        if value is not None:
+            self._active = bool(value)
+        return self._active
+
+    def config(self, *args, **kwargs):
+        self._config.update(kwargs)
+        if args:
+            return self._config.get(args[0])
+        return None
+
+    def gap_advertise(self, interval_us, adv_data=None, resp_data=None, connectable=True):
+        addr = _node.addr if _node else bytes(6)
+        if interval_us is None:
+            air.stop(addr)
+            return
+        air.advertise(_node, addr, bytes(adv_data or b""), bytes(resp_data or b""),
+                      connectable, interval_us)
@@ -0,0 +1,214 @@
+"""
+Simulated boards: several firmware images in one CPython process.
+
+Each Node owns a firmware folder and gets its own copies of the
+per-board modules (machine, bluetooth, aioble, and every module loaded
+from its folder), so the transmitter and the receiver can both import
+"main" and "telemetry" without seeing each other's. Shared modules
+(vclock, air, uasyncio, framebuf, the stdlib) are loaded once.
+
+While a node's code runs, imports are routed through Node.activated():
+at load time via board.current, and afterwards through a context
+variable that every task started by Node.start() inherits.
+"""
+
+import asyncio
+import builtins
+import contextlib
+import contextvars
+import importlib.util
+import os
+import sys
+import tempfile
+
+from vclock import clock
+
+PER_NODE = ("machine", "bluetooth", "aioble")
+
+current = None  # node whose firmware is being loaded
+_active = contextvars.ContextVar("sim_node", default=None)
+_orig_import = builtins.__import__
+
+
+def node():
+    return _active.get() or current
+
+
+def _import(name, globals=None, locals=None, fromlist=(), level=0):
+    n = node()
+    if n is None:
+        return _orig_import(name, globals, locals, fromlist, level)
+    with n.activated():
+        before = len(sys.modules)
+        module = _orig_import(name, globals, locals, fromlist, level)
+        if len(sys.modules) != before:
+            n._adopt()
+        return module
+
+
+def install():
+    builtins.__import__ = _import
+
+
+class Node:
+    def __init__(self, name, folder, addr):
+        self.name = name
+        self.folder = os.path.abspath(folder)
+        self.addr = bytes(addr)
+        self.wiring = {}
+        self.modules = {}
+        self.fs = tempfile.mkdtemp(prefix="sim-%s-" % name)
+        self.main = None  # coroutine the firmware passed to asyncio.run()
+        self.module = None
+        self.quiet = False
+        self.log = []
+        self.stdin = asyncio.Queue()  # serial console input
+        self._depth = 0
+
+    def connect(self, kind, id, device):
+        self.wiring[(kind, id)] = device
+        return device
+
+    def print(self, *args, sep=" ", end="\n", file=None, flush=False):
+        line = sep.join(str(a) for a in args)
+        self.log.append((clock.us, line))
+        if not self.quiet:
+            builtins.print("[%10.3f %s] %s" % (clock.us / 1e6, self.name, line))
+
+    def type(self, line):
+        # Send a line to the firmware's serial console
+        self.stdin.put_nowait(line.encode() + b"\n")
+
+    def open(self, path, mode="r", *args, **kwargs):
+        # The board's flash is a temp directory per node
+        if not os.path.isabs(path):
+            path = os.path.join(self.fs, path)
+        return builtins.open(path, mode, *args, **kwargs)
+
+    def _owns(self, name, module):
+        if name.partition(".")[0] in PER_NODE:
+            return True
+        path = getattr(module, "__file__", None)
+        return bool(path) and os.path.abspath(path).startswith(self.folder + os.sep)
+
+    def _adopt(self):
+        # Route print/open of freshly imported firmware modules to this
+        # node before any of their code runs at the next import level up
+        for name, module in list(sys.modules.items()):
+            if name not in self.modules and self._owns(name, module) \
+                    and name.partition(".")[0] not in PER_NODE:
+                module.print = self.print
+                module.open = self.open
+
+    @contextlib.contextmanager
+    def activated(self):
+        if self._depth:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+        saved = {}
+        for name in list(sys.modules):
+            if name.partition(".")[0] in PER_NODE or name in self.modules:
+                saved[name] = sys.modules.pop(name)
+        sys.modules.update(self.modules)
+        sys.path.insert(0, self.folder)
+        self._depth = 1
+        try:
+            yield
+        finally:
+            self._depth = 0
+            sys.path.remove(self.folder)
+            for name in list(sys.modules):
+                module = sys.modules[name]
+                if self._owns(name, module):
+                    if name not in self.modules:
+                        self.modules[name] = module
+                        if not name.partition(".")[0] in PER_NODE:
+                            module.print = self.print
+                            module.open = self.open
+                    del sys.modules[name]
+            sys.modules.update(saved)
+
+    def load(self, module="main"):
+        """Import the firmware; its asyncio.run() call only records main."""
+        global current
+        spec = importlib.util.spec_from_file_location(
+            module, os.path.join(self.folder, module + ".py"))
+        mod = importlib.util.module_from_spec(spec)
+        mod.print = self.print
+        mod.open = self.open
+        current = self
+        try:
+            with self.activated():
+                sys.modules[module] = mod
+                spec.loader.exec_module(mod)
+        finally:
+            current = None
+        self.module = mod
+        return mod
+
+    def start(self, loop):
+        ctx = contextvars.copy_context()
+        ctx.run(_active.set, self)
+        return loop.create_task(self.main, context=ctx)
+
+    def spawn(self, loop, coro):
+        # Run a helper coroutine as if it were part of this node's firmware
+        ctx = contextvars.copy_context()
+        ctx.run(_active.set, self)
+        return loop.create_task(coro, context=ctx)
+
+
+class World:
+    def __init__(self):
+        import air
+
+        install()
+        air.reset()
+        self.nodes = []
+        self._stop = None
+
+    def add(self, name, folder):
+        addr = bytes((0xC0, 0, 0, 0, 0, len(self.nodes) + 1))
+        n = Node(name, folder, addr)
+        self.nodes.append(n)
+        return n
+
+    def stop(self):
+        # End run() early, e.g. from a scenario coroutine or device callback
+        if self._stop is not None and not self._stop.done():
+            self._stop.set_result(None)
+
+    def run(self, seconds, *scenario):
+        """Load every node, then run them and the scenario coroutines for
+        `seconds` of virtual time or until stop()."""
+        import asyncio
+        import uasyncio
+
+        for n in self.nodes:
+            if n.module is None:
+                n.load()
+        loop = uasyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        tasks = [n.start(loop) for n in self.nodes if n.main is not None]
+        tasks += [loop.create_task(c) for c in scenario]
+        self._stop = loop.create_future()
+        loop.call_later(seconds, self.stop)
+        try:
+            loop.run_until_complete(self._stop)
+        finally:
+            self._stop = None
+            # Like asyncio.run(): cancel everything still pending, including
+            # tasks the firmware started itself
+            pending = asyncio.all_tasks(loop)
+            for t in pending:
+                t.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+            asyncio.set_event_loop(None)
+        for t in tasks:
+            if not t.cancelled() and t.exception() is not None:
+                raise t.exception()
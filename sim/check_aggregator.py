@@ -0,0 +1,138 @@
+"""
+Check of the controller's multi-sensor aggregator.
+
+Drives an Aggregator with readings, faults and the simulated clock: trips
+on any or a quorum, latching through the failsafe, staleness, sequence
+gaps, a full sensor table and forgetting a sensor gone for good, which
+is reported to the forgotten callback and holds the failsafe until it
+reports again or reset is pressed. The relay level is checked after
+every step. Exits non-zero on the first mismatch.
+
+    python sim/check_aggregator.py
+"""
+
+from valvecheck import A, B, C, STALE_MS, FORGET_MS, expect, valve, wait
+import stats
+from valvestate import OPEN, TRIPPED, FAILSAFE
+from aggregator import Aggregator
+
+
+def check_aggregator():
+    v, _ = valve(1)
+    missed = stats.Counter("check_missed")
+    stale = stats.Counter("check_stale")
+    dropped = stats.Counter("check_dropped")
+    forgotten = []
+    agg = Aggregator(v, 1, STALE_MS, 2, missed, stale, FORGET_MS, dropped, forgotten.append)
+
+    # Nothing heard since boot
+    agg.check()
+    expect(v, OPEN, 0)
+    wait(STALE_MS)
+    agg.check()
+    expect(v, FAILSAFE, 1)
+
+    # Any one sensor over its own threshold trips
+    agg.update(A, 1, 9000, 11000, False)
+    expect(v, OPEN, 0)
+    agg.update(B, 1, 9500, 9400, True)
+    expect(v, TRIPPED, 1)
+    agg.update(B, 2, 9000, 9400, False)
+    agg.reset()
+    agg.update(B, 3, 9000, 9400, False)
+    expect(v, OPEN, 0)
+
+    # Sequence gaps, across the wrap too
+    agg.update(A, 4, 9000, 11000, False)
+    assert missed.value == 2, "missed %d" % missed.value
+    agg.update(B, 1, 9000, 9400, False)
+    assert missed.value == 2 + 253, "missed %d" % missed.value
+
+    # A frame that didn't decode, then a good one
+    agg.fault(A)
+    expect(v, FAILSAFE, 1)
+    agg.update(A, 5, 9000, 11000, False)
+    expect(v, OPEN, 0)
+
+    # One sensor going stale; a trip from the other still wins
+    wait(STALE_MS // 2)
+    agg.update(B, 2, 9000, 9400, False)
+    wait(STALE_MS // 2)
+    agg.check()
+    expect(v, FAILSAFE, 1)
+    assert stale.value == 1, "stale %d" % stale.value
+    agg.update(B, 3, 9600, 9400, True)
+    expect(v, TRIPPED, 1)
+    agg.reset()
+    agg.update(B, 4, 9000, 9400, False)
+    expect(v, FAILSAFE, 1)
+    agg.update(A, 6, 9000, 11000, False)
+    expect(v, OPEN, 0)
+
+    # Table full: a third sensor is counted, not tracked
+    agg.update(C, 1, 12000, 11000, True)
+    expect(v, OPEN, 0)
+    assert dropped.value == 1 and C not in agg.sensors
+
+    # A gone for good: failsafe, then forgotten, freeing its slot for C.
+    # Its sink is still unwatched, so the failsafe holds while B reports
+    for _ in range(FORGET_MS // 1000):
+        wait(1000)
+        agg.update(B, None, 9000, 9400, False)
+        agg.check()
+    assert A not in agg.sensors, "stale sensor not forgotten"
+    assert forgotten == [A], "forgotten %r" % forgotten
+    expect(v, FAILSAFE, 1)
+    agg.update(B, None, 9000, 9400, False)
+    expect(v, FAILSAFE, 1)
+    agg.update(C, 1, 9000, 11000, False)
+    assert C in agg.sensors
+    expect(v, FAILSAFE, 1)
+
+    # The reset button lets go of it; the next reading opens the valve
+    agg.reset()
+    expect(v, FAILSAFE, 1)
+    agg.check()
+    expect(v, FAILSAFE, 1)
+    agg.update(B, None, 9000, 9400, False)
+    expect(v, OPEN, 0)
+
+    # Every sensor forgotten: the failsafe holds, the valve doesn't open
+    wait(FORGET_MS)
+    agg.check()
+    assert not agg.sensors
+    assert forgotten == [A, B, C], "forgotten %r" % forgotten
+    expect(v, FAILSAFE, 1)
+    agg.check()
+    expect(v, FAILSAFE, 1)
+
+    # Quorum of two
+    v, _ = valve(1)
+    agg = Aggregator(v, 2, STALE_MS, 4)
+    agg.update(A, 1, 9600, 9400, True)
+    expect(v, OPEN, 0)
+    agg.update(B, 1, 9600, 9400, True)
+    expect(v, TRIPPED, 1)
+
+    # A forgotten sensor that reports again lets go of the failsafe itself
+    v, _ = valve(1)
+    agg = Aggregator(v, 1, STALE_MS, 4, forget_ms=FORGET_MS)
+    agg.update(A, 1, 9000, 11000, False)
+    agg.update(B, 1, 9000, 11000, False)
+    for _ in range(FORGET_MS // 1000):
+        wait(1000)
+        agg.update(B, None, 9000, 11000, False)
+        agg.check()
+    assert A not in agg.sensors
+    expect(v, FAILSAFE, 1)
+    agg.update(A, 2, 9000, 11000, False)
+    expect(v, OPEN, 0)
+
+
+def main():
+    check_aggregator()
+    print("aggregator: any, quorum, staleness and forgetting ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Round-trip check of the telemetry frame codec.
+
+Random readings go through the sensor's FrameBuilder and back out of the
+controller's Frame.decode(), each board's own copy of telemetry.py. Every
+sample must come back in order with its threshold, with probes beyond
+what fits in max_len left out hottest-first and counted, INVALID and
+deltas that need an escape intact, readings at the threshold sent by the
+add() that took them, full frames sent by the add() that filled them,
+and no frame longer than max_len or held past max_age_ms. Legacy frames and broadcast adverts are decoded too. Exits
+non-zero on the first mismatch.
+
+    python sim/check_frames.py [--cases 300] [--seed 1]
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import struct
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import vclock  # noqa: E402
+
+vclock.install()  # ticks_diff for FrameBuilder
+
+
+def load(folder, name):
+    # A board's own copy of a module, under a name of its own
+    path = os.path.join(ROOT, folder, name + ".py")
+    spec = importlib.util.spec_from_file_location(name + "_" + folder.split()[0].lower(), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+enc = load("Temperature Sensor (TRANSMIT)", "telemetry")
+dec = load("Valve Controller (RECEIVE)", "telemetry")
+
+
+class Count:
+    # Stands in for stats.Counter
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+def reading(rng, prev):
+    # Mostly small steps, sometimes a jump that needs an escape, a failed
+    # probe or the edge of the i16 range
+    r = rng.random()
+    if r < 0.05:
+        return enc.INVALID
+    if r < 0.10:
+        return rng.choice((-32767, 32767))
+    if r < 0.25 or prev == enc.INVALID:
+        return rng.randint(-6700, 25700)
+    return max(-32767, min(32767, prev + rng.randint(-130, 130)))
+
+
+def check_case(rng):
+    max_len = rng.choice((12, 14, 20, 27, 60, 244))
+    max_samples = rng.randint(1, 8)
+    max_age_ms = rng.choice((0, 0, 250, 1000))
+    period = rng.choice((50, 100, 200, 400))
+    probes = rng.randint(1, 12)
+    fit = (max_len - enc.HEADER_LEN) // 2
+    thr = rng.randint(9000, 13000)
+
+    sent = []
+    overflow = Count()
+    fb = enc.FrameBuilder(lambda f: sent.append(bytes(f)), max_len, max_samples, max_age_ms, overflow)
+    expected = []  # (threshold, the sample as it should decode)
+    dropped = 0
+    temps = [rng.randint(7000, 11000) for _ in range(probes)]
+    now = rng.randint(0, 0x20000)
+    for _ in range(rng.randint(1, 60)):
+        if rng.random() < 0.05:
+            probes = rng.randint(1, 12)  # hot-plug
+            temps = [rng.randint(7000, 11000) for _ in range(probes)]
+        if rng.random() < 0.05:
+            thr = rng.randint(9000, 13000)
+        temps = [reading(rng, t) for t in temps]
+        want = sorted(temps, reverse=True)[:fit] if len(temps) > fit else list(temps)
+        dropped += len(temps) - len(want)
+        before = len(sent)
+        fb.add(temps, thr, now)
+        if any(v != enc.INVALID and v >= thr for v in want):
+            assert len(sent) > before, "reading at the threshold held back"
+        if fb.n:
+            assert fb.worst_len(fb.probes, fb.n + 1) <= max_len, "full frame held back"
+        expected.append((thr, want))
+        now += period
+    fb.flush()
+    assert overflow.value == dropped, "overflow %d, expected %d" % (overflow.value, dropped)
+
+    frame = dec.Frame()
+    got = []
+    seq = None
+    for data in sent:
+        assert len(data) <= max_len, "frame of %d bytes, max_len %d" % (len(data), max_len)
+        assert len(data) != dec.LEGACY_LEN, "batched frame mistaken for a legacy one"
+        assert frame.decode(data), "frame didn't decode"
+        if seq is not None:
+            assert frame.seq == (seq + 1) & 0xff, "sequence gap"
+        seq = frame.seq
+        n_probes, n = data[8], data[9]
+        assert frame.n == n_probes * n
+        if max_age_ms and n > 1:
+            age = struct.unpack_from("<H", data, 4)[0] * (n - 1)
+            assert age <= max_age_ms, "first sample %d ms old" % age
+        for s in range(n):
+            got.append((frame.threshold, [frame.values[p * n + s] for p in range(n_probes)]))
+        # A truncated frame must not decode
+        if len(data) > dec.HEADER_LEN + 1:
+            cut = data[:rng.randint(dec.HEADER_LEN, len(data) - 1)]
+            assert len(cut) == dec.LEGACY_LEN or not frame.decode(cut), "truncated frame decoded"
+    assert got == expected, "samples differ after the round trip"
+
+
+def check_full_frames():
+    # A frame is sent by the add() that filled it, not a period later
+    for probes, samples in ((4, 1), (1, 3)):
+        sent = []
+        fb = enc.FrameBuilder(lambda f: sent.append(bytes(f)), 20, 8)
+        for k in range(samples):
+            assert not sent, "%d-probe frame sent early" % probes
+            fb.add([9000 + k] * probes, 12000, k * 100)
+        assert len(sent) == 1, "%d-probe frame of %d samples held back" % (probes, samples)
+        assert sent[0][9] == samples
+
+
+def check_legacy():
+    frame = dec.Frame()
+    assert frame.decode(struct.pack("<ff", 110.5, 120.0))
+    assert frame.seq is None and frame.n == 1
+    assert frame.values[0] == 11050 and frame.threshold == 12000
+    assert not frame.decode(b"\x00" * 12), "unknown version decoded"
+
+
+def check_advert():
+    frame = dec.Frame()
+    adv = enc.Advert("TempMon")
+    for seq, temp, thr in ((0, 9860, 11000), (300, enc.INVALID, 10400), (7, -32767, 12000)):
+        buf = adv.fill(seq, temp, thr)
+        assert frame.decode_advert(buf[adv.at:]), "advert didn't decode"
+        assert (frame.seq, frame.values[0], frame.threshold) == (seq & 0xff, temp, thr)
+        assert bytes(buf) == bytes(enc.advert_data("TempMon", seq, temp, thr))
+    assert not frame.decode_advert(b"\x00" * enc.ADVERT_LEN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=300, help="random builder setups")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for i in range(args.cases):
+        try:
+            check_case(rng)
+        except AssertionError:
+            print("case %d of seed %d failed" % (i, args.seed))
+            raise
+    check_full_frames()
+    check_legacy()
+    check_advert()
+    print("frames: %d cases, legacy and advert ok" % args.cases)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Transition check of the controller's valve state machine.
+
+Walks ValveState through every transition: trips, the latch, reset,
+and the failsafe holding or closing the relay. Then presses reset
+through an Aggregator, whose check() runs on a timer, to make sure only a
+reading from after the press resolves RESET_PENDING. The relay level is
+checked after every step. Exits non-zero on the first mismatch.
+
+    python sim/check_valvestate.py
+"""
+
+from valvecheck import A, B, STALE_MS, expect, valve, wait
+from valvestate import OPEN, TRIPPED, RESET_PENDING, FAILSAFE
+from aggregator import Aggregator
+
+
+def check_transitions():
+    v, trips = valve()
+    expect(v, OPEN, 0)
+    v.reading(False)
+    expect(v, OPEN, 0)
+    v.reset()  # nothing latched
+    expect(v, OPEN, 0)
+    v.reading(True)
+    expect(v, TRIPPED, 1)
+    v.reading(False)  # latched
+    expect(v, TRIPPED, 1)
+    v.reset()
+    expect(v, RESET_PENDING, 0)
+    v.reading(True)  # still hot: trips again
+    expect(v, TRIPPED, 1)
+    v.reset()
+    v.reading(False)
+    expect(v, OPEN, 0)
+    assert trips.value == 2, "trips %d" % trips.value
+
+    # Failsafe holding the relay, then closing it
+    v.fault("stale")
+    expect(v, FAILSAFE, 0)
+    v.reading(False)
+    expect(v, OPEN, 0)
+    v, trips = valve(1)
+    v.fault("stale")
+    expect(v, FAILSAFE, 1)
+    v.reading(False)
+    expect(v, OPEN, 0)
+
+    # A trip latched before the failsafe is still latched after it
+    v.reading(True)
+    v.fault("stale")
+    expect(v, FAILSAFE, 1)
+    v.reading(False)
+    expect(v, TRIPPED, 1)
+    v.reset()  # only a latched TRIPPED resets
+    expect(v, RESET_PENDING, 0)
+    v.fault("stale")
+    v.reset()
+    expect(v, FAILSAFE, 1)
+    assert trips.value == 1, "a re-entered latch counted as a new trip"
+
+
+def check_reset_pending():
+    v, trips = valve(1)
+    agg = Aggregator(v, 1, STALE_MS, 4)
+    agg.update(A, 1, 9000, 11000, False)
+    agg.update(B, 1, 9500, 9400, True)
+    expect(v, TRIPPED, 1)
+
+    # The supervisor's periodic check doesn't re-apply B's old reading
+    agg.reset()
+    expect(v, RESET_PENDING, 0)
+    for _ in range(10):
+        wait(250)
+        agg.check()
+        expect(v, RESET_PENDING, 0)
+
+    # B still hot after the press: trips again
+    agg.update(B, 2, 9500, 9400, True)
+    expect(v, TRIPPED, 1)
+    agg.reset()
+    agg.update(B, 3, 9000, 9400, False)
+    expect(v, OPEN, 0)
+    agg.check()
+    expect(v, OPEN, 0)
+    assert trips.value == 2, "trips %d" % trips.value
+
+    # A stale sensor still enters the failsafe from check()
+    agg.update(B, 4, 9500, 9400, True)
+    agg.reset()
+    wait(STALE_MS)
+    agg.check()
+    expect(v, FAILSAFE, 1)
+
+
+def main():
+    check_transitions()
+    check_reset_pending()
+    print("valvestate: transitions and reset ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Pure-Python stand-in for MicroPython's framebuf module.
+
+Only MONO_VLSB (the SSD1306 layout) is implemented. text() draws a
+placeholder 8x8 cell per character from the character code rather than
+the real built-in font; it costs the same number of pixel writes, which
+is what the host benchmarks care about.
+"""
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+RGB565 = 1
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format != MONO_VLSB:
+            raise ValueError("only MONO_VLSB is simulated")
+        if len(buffer) < width * ((height + 7) // 8):
+            raise ValueError("buffer too small")
+        self._buf = buffer
+        self._w = width
+        self._h = height
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._w and 0 <= y < self._h):
+            return None
+        i = (y >> 3) * self._w + x
+        bit = 1 << (y & 7)
+        if c is None:
+            return 1 if self._buf[i] & bit else 0
+        if c:
+            self._buf[i] |= bit
+        else:
+            self._buf[i] &= ~bit & 0xff
+
+    def fill(self, c):
+        v = 0xff if c else 0
+        buf = self._buf
+        for i in range(self._w * ((self._h + 7) // 8)):
+            buf[i] = v
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(x, 0)
+        x1 = min(x + w, self._w)
+        y0 = max(y, 0)
+        y1 = min(y + h, self._h)
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                self.pixel(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def text(self, s, x, y, c=1):
+        for ch in s:
+            code = ord(ch)
+            if ch != " ":
+                for col in range(7):
+                    bits = (code * (col + 3)) & 0x7f
+                    for row in range(7):
+                        if bits & (1 << row):
+                            self.pixel(x + col, y + row, c)
+            x += 8
+
+    def _column(self, x):
+        # MONO_VLSB pages are strided by the width, LSB is the top pixel
+        end = self._w * ((self._h + 7) // 8)
+        return int.from_bytes(bytes(self._buf[x:end:self._w]), "little")
+
+    def _set_column(self, x, v):
+        pages = (self._h + 7) // 8
+        self._buf[x:self._w * pages:self._w] = v.to_bytes(pages, "little")
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        # Whole columns at a time, so the host cost tracks the native one
+        src_mask = (1 << fbuf._h) - 1
+        dst_mask = (1 << self._h) - 1
+        for sx in range(fbuf._w):
+            dx = x + sx
+            if not 0 <= dx < self._w:
+                continue
+            col = fbuf._column(sx) & src_mask
+            if y >= 0:
+                bits = col << y
+                m = src_mask << y
+            else:
+                bits = col >> -y
+                m = src_mask >> -y
+            m &= dst_mask
+            bits &= m
+            dcol = self._column(dx)
+            if key == 0:
+                dcol |= bits
+            elif key == 1:
+                dcol &= ~(m & ~bits)
+            else:
+                dcol = (dcol & ~m) | bits
+            self._set_column(dx, dcol)
+
+    def scroll(self, xstep, ystep):
+        old = bytes(self._buf)
+        src = FrameBuffer(bytearray(old), self._w, self._h, MONO_VLSB)
+        self.blit(src, xstep, ystep)
@@ -0,0 +1,230 @@
+"""
+Host stand-in for the MicroPython machine module.
+
+Peripherals are plain Python objects. A simulated external circuit is
+attached to a pin or bus id with connect() before the driver code creates
+its Pin/UART/ADC/I2C, e.g. connect("pin", 2, onewire_bus.OneWireBus(...)).
+Under sim/board.py every node has its own copy of this module wired from
+Node.connect().
+"""
+
+import board
+from vclock import clock, install
+
+install()
+
+_node = board.node()
+_wiring = _node.wiring if _node else {}
+irq_disables = 0
+wdt_resets = 0
+
+
+def connect(kind, id, device):
+    _wiring[(kind, id)] = device
+
+
+def disconnect_all():
+    _wiring.clear()
+
+
+def disable_irq():
+    global irq_disables
+    irq_disables += 1
+    return 0
+
+
+def enable_irq(state):
+    pass
+
+
+def freq(hz=None):
+    return 160_000_000
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.ext = _wiring.get(("pin", id))
+        self.mode = None
+        self.pull = None
+        self._value = 0
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if pull != -1:
+            self.pull = pull
+            if pull == self.PULL_UP and value is None:
+                self._value = 1
+        if value is not None:
+            self.value(value)
+
+    def value(self, v=None):
+        ext = self.ext
+        if v is None:
+            return ext.read() if ext is not None else self._value
+        self._value = 1 if v else 0
+        if ext is not None:
+            ext.write(self._value)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        # Edges come from an attached device with watch(); the handler runs
+        # straight away, like a hard IRQ
+        ext = self.ext
+        if ext is None or not hasattr(ext, "watch"):
+            return
+
+        def edge(level):
+            if handler is not None and trigger & (self.IRQ_RISING if level else self.IRQ_FALLING):
+                handler(self)
+        ext.watch(edge)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+
+class UART:
+    def __init__(self, id, baudrate=9600, **kwargs):
+        self.id = id
+        self.ext = _wiring.get(("uart", id))
+        self.baudrate = baudrate
+        self.rx = bytearray()
+        self.init(baudrate, **kwargs)
+
+    def init(self, baudrate=None, bits=8, parity=None, stop=1, **kwargs):
+        if baudrate:
+            self.baudrate = baudrate
+
+    def write(self, buf):
+        # With nothing connected the line loops TX straight back to RX
+        ext = self.ext
+        baud = self.baudrate
+        for b in bytes(buf):
+            clock.advance(10_000_000 // baud)  # start + 8 data + stop bits
+            self.rx.append(ext.uart_xfer(b, baud) if ext is not None else b)
+        return len(buf)
+
+    def any(self):
+        return len(self.rx)
+
+    def read(self, n=None):
+        rx = self.rx
+        if not rx:
+            return None
+        n = len(rx) if n is None else min(n, len(rx))
+        data = bytes(rx[:n])
+        del rx[:n]
+        return data
+
+    def readinto(self, buf, n=None):
+        rx = self.rx
+        n = min(len(buf) if n is None else n, len(rx))
+        if not n:
+            return None
+        buf[:n] = rx[:n]
+        del rx[:n]
+        return n
+
+    def flush(self):
+        pass
+
+
+class WDT:
+    # A missed feed is logged on the node and counted in wdt_resets; the
+    # firmware keeps running, since the sim can't reboot a node in place
+    def __init__(self, id=0, timeout=5000):
+        import asyncio
+        self.timeout = timeout
+        self._loop = asyncio.get_event_loop()
+        self._handle = None
+        self.feed()
+
+    def feed(self):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = self._loop.call_at(self._loop.time() + self.timeout / 1000, self._expired)
+
+    def _expired(self):
+        global wdt_resets
+        wdt_resets += 1
+        if _node is not None:
+            _node.print("WDT reset")
+        self.feed()
+
+
+class ADC:
+    ATTN_0DB = 0
+    ATTN_2_5DB = 1
+    ATTN_6DB = 2
+    ATTN_11DB = 3
+    WIDTH_12BIT = 3
+
+    def __init__(self, pin, atten=None):
+        id = pin.id if isinstance(pin, Pin) else pin
+        self.ext = _wiring.get(("adc", id))
+
+    def atten(self, value):
+        pass
+
+    def width(self, value):
+        pass
+
+    def read(self):
+        return self.ext.read() if self.ext is not None else 0
+
+    def read_u16(self):
+        return self.read() << 4
+
+
+class I2C:
+    def __init__(self, id, scl=None, sda=None, freq=400000, timeout=50000):
+        self.id = id
+        self.freq = freq
+        self.ext = _wiring.get(("i2c", id))
+
+    def init(self, scl=None, sda=None, freq=400000):
+        self.freq = freq
+
+    def _cost(self, nbytes):
+        # address byte + data, 9 clocks each (8 bits + ACK), blocking
+        clock.advance((nbytes + 1) * 9 * 1_000_000 // self.freq)
+
+    def scan(self):
+        return self.ext.addresses() if self.ext is not None else []
+
+    def writeto(self, addr, buf, stop=True):
+        data = bytes(buf)
+        self._cost(len(data))
+        if self.ext is None:
+            raise OSError(19)  # ENODEV, nothing ACKs
+        self.ext.i2c_write(addr, data)
+        return len(data)
+
+    def writevto(self, addr, vector, stop=True):
+        data = b"".join(bytes(b) for b in vector)
+        return self.writeto(addr, data, stop)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        self._cost(len(buf))
+        if self.ext is None:
+            raise OSError(19)
+        buf[:] = self.ext.i2c_read(addr, len(buf))
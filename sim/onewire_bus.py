@@ -0,0 +1,243 @@
+"""
+Virtual 1-Wire bus with simulated DS18B20 probes.
+
+OneWireBus can be attached to a simulated Pin (bit-banged driver) or UART
+(onewire_uart driver). Both are decoded into the same reset/time-slot
+model: on every slot each device says what it drives, the line carries
+the wired-AND of master and devices, and every device then samples it.
+"""
+
+import random
+
+from vclock import clock
+
+# ROM commands
+SEARCH_ROM = 0xf0
+READ_ROM = 0x33
+MATCH_ROM = 0x55
+SKIP_ROM = 0xcc
+ALARM_SEARCH = 0xec
+# Function commands
+CONVERT = 0x44
+READ_SCRATCH = 0xbe
+WRITE_SCRATCH = 0x4e
+COPY_SCRATCH = 0x48
+RECALL_EE = 0xb8
+READ_POWER = 0xb4
+
+RESET_US = 480  # minimum reset low time
+WRITE0_US = 15  # low longer than this is a write-0 slot
+CONV_MS = {9: 94, 10: 188, 11: 375, 12: 750}
+
+_BUSY = 2  # drive marker: a read slot answers the conversion state
+
+
+def crc8(data):
+    crc = 0
+    for b in data:
+        for _ in range(8):
+            mix = (crc ^ b) & 1
+            crc >>= 1
+            if mix:
+                crc ^= 0x8c
+            b >>= 1
+    return crc
+
+
+def make_rom(serial, family=0x28):
+    rom = bytearray(8)
+    rom[0] = family
+    rom[1:7] = serial.to_bytes(6, "little")
+    rom[7] = crc8(rom[:7])
+    return bytes(rom)
+
+
+class DS18B20:
+    def __init__(self, rom, temp=25.0, th=0x4b, tl=0x46, res_bits=12,
+                 conv_ms=None, fault_rate=0.0, seed=None, parasite=False):
+        self.rom = bytes(rom)
+        self.temp = temp  # what the probe is immersed in, in C
+        self.th = th
+        self.tl = tl
+        self.config = ((res_bits - 9) << 5) | 0x1f
+        self.conv_ms = conv_ms  # None follows the datasheet for the resolution
+        self.parasite = parasite  # powered from the data line: can't signal busy
+        self.fault_rate = fault_rate
+        self.rng = random.Random(seed)
+        self.present = True
+        self.raw = 0x0550  # power-on value, 85 C
+        self.done_at = 0
+        self.converts = 0
+        self.scratch_reads = 0
+        self.crc_faults = 0
+        self.gen = None
+        self.drive = 1
+
+    @property
+    def res_bits(self):
+        return ((self.config >> 5) & 3) + 9
+
+    def alarm(self):
+        t = self._signed(self.raw) >> 4
+        return t >= self._int8(self.th) or t <= self._int8(self.tl)
+
+    @staticmethod
+    def _signed(raw):
+        return raw - 0x10000 if raw & 0x8000 else raw
+
+    @staticmethod
+    def _int8(v):
+        return v - 0x100 if v & 0x80 else v
+
+    def scratchpad(self):
+        buf = bytearray(9)
+        buf[0] = self.raw & 0xff
+        buf[1] = self.raw >> 8
+        buf[2] = self.th
+        buf[3] = self.tl
+        buf[4] = self.config
+        buf[5] = 0xff
+        buf[6] = 0x0c
+        buf[7] = 0x10
+        buf[8] = crc8(buf[:8])
+        if self.fault_rate and self.rng.random() < self.fault_rate:
+            buf[8] ^= 0x01 << self.rng.randrange(8)
+            self.crc_faults += 1
+        return buf
+
+    # Bus protocol, one generator step per time slot. The value yielded is
+    # what the device drives in the next slot (1 releases the line), the
+    # value sent back in is the level the bus actually carried.
+
+    def reset(self):
+        if not self.present:
+            self.gen = None
+            self.drive = 1
+            return False
+        self.gen = self._session()
+        self.drive = next(self.gen)
+        return True
+
+    def level(self):
+        if self.drive == _BUSY:
+            return 0 if clock.us < self.done_at and not self.parasite else 1
+        return self.drive
+
+    def sample(self, level):
+        if self.gen is not None:
+            self.drive = self.gen.send(level)
+
+    def _recv(self, nbits):
+        value = 0
+        for i in range(nbits):
+            value |= (yield 1) << i
+        return value
+
+    def _send(self, data):
+        for b in data:
+            for i in range(8):
+                yield (b >> i) & 1
+
+    def _idle(self):
+        while True:
+            yield 1
+
+    def _session(self):
+        cmd = yield from self._recv(8)
+        if cmd == READ_ROM:
+            yield from self._send(self.rom)
+        elif cmd == MATCH_ROM:
+            rom = yield from self._recv(64)
+            if rom != int.from_bytes(self.rom, "little"):
+                yield from self._idle()
+        elif cmd in (SEARCH_ROM, ALARM_SEARCH):
+            if cmd == ALARM_SEARCH and not self.alarm():
+                yield from self._idle()
+            for byte in self.rom:
+                for i in range(8):
+                    bit = (byte >> i) & 1
+                    yield bit
+                    yield bit ^ 1
+                    if (yield 1) != bit:
+                        yield from self._idle()
+        elif cmd != SKIP_ROM:
+            yield from self._idle()
+        yield from self._function()
+
+    def _function(self):
+        cmd = yield from self._recv(8)
+        if cmd == CONVERT:
+            conv_ms = self.conv_ms
+            if conv_ms is None:
+                conv_ms = CONV_MS[self.res_bits]
+            self.done_at = clock.us + int(conv_ms * 1000)
+            raw = int(round(self.temp * 16)) & 0xffff
+            self.raw = raw & ~((1 << (12 - self.res_bits)) - 1) & 0xffff
+            self.converts += 1
+            while True:
+                yield _BUSY
+        elif cmd == READ_SCRATCH:
+            self.scratch_reads += 1
+            yield from self._send(self.scratchpad())
+        elif cmd == WRITE_SCRATCH:
+            self.th = yield from self._recv(8)
+            self.tl = yield from self._recv(8)
+            self.config = ((yield from self._recv(8)) & 0x60) | 0x1f
+        elif cmd == READ_POWER:
+            yield 0 if self.parasite else 1
+        yield from self._idle()
+
+
+class OneWireBus:
+    def __init__(self, devices=()):
+        self.devices = list(devices)
+        self.master = 1
+        self.low_since = 0
+        self.sampled = 1
+        self.resets = 0
+        self.slots = 0
+
+    def add(self, device):
+        self.devices.append(device)
+
+    def reset(self):
+        self.resets += 1
+        present = False
+        for d in self.devices:
+            present |= d.reset()
+        return present
+
+    def slot(self, master):
+        self.slots += 1
+        level = master
+        for d in self.devices:
+            level &= d.level()
+        for d in self.devices:
+            d.sample(level)
+        return level
+
+    # Pin side: decode the bit-banged waveform by how long the line was low
+
+    def write(self, value):
+        if not value and self.master:
+            self.low_since = clock.us
+            self.sampled = 1
+        elif value and not self.master:
+            low = clock.us - self.low_since
+            if low >= RESET_US:
+                self.sampled = 0 if self.reset() else 1
+            else:
+                self.sampled = self.slot(0 if low >= WRITE0_US else 1)
+        self.master = value
+
+    def read(self):
+        return self.sampled if self.master else 0
+
+    # UART side: 9600 baud bytes are resets, faster ones are single slots
+
+    def uart_xfer(self, byte, baud):
+        if baud < 20000:
+            return 0xe0 if self.reset() else byte
+        if byte == 0xff:
+            return 0xff if self.slot(1) else 0xf8
+        return 0x00 if not self.slot(0) else byte
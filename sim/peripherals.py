@@ -0,0 +1,158 @@
+"""
+Simulated external circuits for the boards' pins and buses.
+
+Each one is attached with Node.connect(kind, id, device) and implements
+the side of the interface its driver uses: read()/write() for a pin,
+read() for an ADC channel, i2c_write() for an I2C target. Inputs that
+raise edges for Pin.irq() also have watch(callback).
+"""
+
+import asyncio
+
+from vclock import clock
+
+
+class Knob:
+    # Potentiometer on an ADC channel, raw 12-bit reading
+    def __init__(self, raw=0):
+        self.raw = raw
+
+    def read(self):
+        return self.raw
+
+
+class Recorder:
+    # Output pin load (LED, valve relay) that logs every level change
+    def __init__(self, level=0, on_change=None):
+        self.level = level
+        self.changes = []  # (us, level)
+        self.on_change = on_change  # called with the new level
+
+    def read(self):
+        return self.level
+
+    def write(self, v):
+        if v != self.level:
+            self.level = v
+            self.changes.append((clock.us, v))
+            if self.on_change is not None:
+                self.on_change(v)
+
+    def first(self, level, after=0):
+        # Time of the first change to `level` at or after `after`, or None
+        for t, v in self.changes:
+            if v == level and t >= after:
+                return t
+        return None
+
+
+class Button:
+    # Momentary switch to ground on a pulled-up input
+    def __init__(self):
+        self.pressed = False
+        self.watchers = []  # Pin.irq() edge callbacks, called with the new level
+
+    def read(self):
+        return 0 if self.pressed else 1
+
+    def write(self, v):
+        pass
+
+    def watch(self, callback):
+        self.watchers.append(callback)
+
+    def _set(self, pressed):
+        if pressed != self.pressed:
+            self.pressed = pressed
+            for w in self.watchers:
+                w(self.read())
+
+    def press(self):
+        self._set(True)
+
+    def release(self):
+        self._set(False)
+
+    async def tap(self, hold_ms=200, bounces=3, bounce_ms=2):
+        # Press and release, each edge chattering `bounces` extra times
+        for pressed, ms in ((True, hold_ms), (False, 0)):
+            for _ in range(bounces):
+                self._set(pressed)
+                await asyncio.sleep(bounce_ms / 1000)
+                self._set(not pressed)
+                await asyncio.sleep(bounce_ms / 1000)
+            self._set(pressed)
+            await asyncio.sleep(ms / 1000)
+
+
+class SSD1306Panel:
+    """
+    I2C SSD1306 that decodes control bytes (0x80 single command, 0x00
+    command stream, 0x40 data) and the column/page address window, so the
+    RAM it ends up with can be compared with the driver's framebuffer.
+    """
+
+    def __init__(self, width=128, height=64, addr=0x3C):
+        self.width = width
+        self.pages = height // 8
+        self.addr = addr
+        self.ram = bytearray(width * self.pages)
+        self.cmds = []
+        self.writes = 0
+        self.data_bytes = 0
+        self.cols = (0, width - 1)
+        self.page_range = (0, self.pages - 1)
+        self.col = 0
+        self.page = 0
+        self._args = []
+
+    def addresses(self):
+        return [self.addr]
+
+    def i2c_write(self, addr, data):
+        if addr != self.addr or not data:
+            raise OSError(19)
+        self.writes += 1
+        ctrl = data[0]
+        if ctrl == 0x40:
+            self._data(data[1:])
+        elif ctrl == 0x80:
+            self._cmd(data[1])
+        elif ctrl == 0x00:
+            for b in data[1:]:
+                self._cmd(b)
+
+    def _cmd(self, b):
+        if self._args:
+            # Collecting parameters for a multi-byte command
+            self._args.append(b)
+            op = self._args[0]
+            if op in (0x21, 0x22) and len(self._args) == 3:
+                if op == 0x21:
+                    self.cols = (self._args[1], self._args[2])
+                    self.col = self._args[1]
+                else:
+                    self.page_range = (self._args[1], self._args[2])
+                    self.page = self._args[1]
+                self._args = []
+            elif op not in (0x21, 0x22) and len(self._args) == 2:
+                self._args = []
+            return
+        self.cmds.append(b)
+        if b in (0x21, 0x22, 0x20, 0x81, 0xA8, 0xD3, 0xDA, 0xD5, 0xD9, 0xDB, 0x8D):
+            self._args = [b]
+
+    def _data(self, data):
+        # Horizontal addressing: column first, wrapping to the next page
+        self.data_bytes += len(data)
+        c0, c1 = self.cols
+        p0, p1 = self.page_range
+        for b in data:
+            if 0 <= self.col < self.width and 0 <= self.page < self.pages:
+                self.ram[self.page * self.width + self.col] = b
+            self.col += 1
+            if self.col > c1:
+                self.col = c0
+                self.page += 1
+                if self.page > p1:
+                    self.page = p0
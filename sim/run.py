@@ -0,0 +1,159 @@
+"""
+Run the sensor and the valve controller firmware together on the host.
+
+Both main.py files run unmodified against simulated hardware: a DS18B20
+on the sensor's 1-Wire pin, the threshold knob, the OLED, and the valve
+relay and reset button on the controller, linked over the simulated BLE
+radio. Time is virtual, so a minute of operation takes a few seconds.
+
+    python sim/run.py [--seconds 60] [--sensors 3] [--transport broadcast] [--log 4]
+                      [--stats] [--reset 45] [--outage 20:1.5] [--quiet]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import air  # noqa: E402
+from board import World  # noqa: E402
+from onewire_bus import DS18B20, OneWireBus, make_rom  # noqa: E402
+from peripherals import Button, Knob, Recorder, SSD1306Panel  # noqa: E402
+from vclock import clock  # noqa: E402
+
+SENSOR_DIR = os.path.join(ROOT, "Temperature Sensor (TRANSMIT)")
+VALVE_DIR = os.path.join(ROOT, "Valve Controller (RECEIVE)")
+
+
+def knob_raw(threshold_f):
+    # Inverse of the sensor's map_value() over the calibrated knob range
+    return int(180 + (threshold_f - 104.0) * (3200 - 180) / (120.0 - 104.0))
+
+
+def build(threshold_f=110.0, temp_c=30.0, probes=1, sensors=1):
+    """The world with `sensors` sensor boards and the controller; returns
+    (world, rig). rig's sensor, knob and panel are the first board's, and
+    boards lists every board's parts; probes holds every probe."""
+    world = World()
+    boards = []
+    for i in range(sensors):
+        node = world.add("sensor" if i == 0 else "sensor%d" % (i + 1), SENSOR_DIR)
+        boards.append({
+            "sensor": node,
+            "probes": [DS18B20(make_rom(i * probes + j + 1), temp=temp_c) for j in range(probes)],
+            "knob": Knob(knob_raw(threshold_f)),
+            "panel": SSD1306Panel(),
+            "red": Recorder(),
+        })
+    valve = world.add("valve", VALVE_DIR)
+    rig = dict(boards[0])
+    rig.update({
+        "boards": boards,
+        "probes": [p for b in boards for p in b["probes"]],
+        "valve": valve,
+        "relay": Recorder(),
+        "button": Button(),
+    })
+    for b in boards:
+        node = b["sensor"]
+        bus = OneWireBus(b["probes"])
+        node.connect("pin", 2, bus)
+        node.connect("uart", 1, bus)
+        node.connect("adc", 1, b["knob"])
+        node.connect("i2c", 0, b["panel"])
+        node.connect("pin", 11, b["red"])
+    valve.connect("pin", 4, rig["relay"])
+    valve.connect("pin", 15, rig["button"])
+    return world, rig
+
+
+async def ramp(probes, start_c, end_c, start_s, duration_s, step_ms=100):
+    # Linear water-temperature ramp seen by every probe. Follows the clock
+    # rather than counting steps, since blocking driver code delays timers.
+    t0 = clock.us + int(start_s * 1e6)
+    t1 = t0 + int(duration_s * 1e6)
+    while True:
+        now = clock.us
+        f = min(max((now - t0) / (t1 - t0), 0.0), 1.0)
+        for p in probes:
+            p.temp = start_c + (end_c - start_c) * f
+        if now >= t1:
+            return
+        await asyncio.sleep(step_ms / 1000)
+
+
+async def ask_stats(world, seconds):
+    # Type "stats" into every board's serial console just before the end
+    await asyncio.sleep(max(0.0, seconds - 0.5))
+    for n in world.nodes:
+        n.quiet = False
+        n.type("stats")
+
+
+async def press_reset(button, at_s):
+    # Bouncy press of the controller's reset button
+    await asyncio.sleep(at_s - clock.us / 1e6)
+    await button.tap()
+
+
+async def outage(node, at_s, for_s):
+    # The sensor board drops off the air, links and adverts both
+    await asyncio.sleep(at_s - clock.us / 1e6)
+    air.out_of_range(node.addr, for_s * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=60.0, help="virtual seconds to run")
+    parser.add_argument("--threshold", type=float, default=110.0, help="knob setting, F")
+    parser.add_argument("--sensors", type=int, default=1, help="sensor boards, each on its own sink")
+    parser.add_argument("--transport", choices=("gatt", "broadcast"), default="gatt")
+    parser.add_argument("--log", type=int, default=3, help="firmware log level, 0-4")
+    parser.add_argument("--stats", action="store_true", help="print each board's stats at the end")
+    parser.add_argument("--reset", type=float, action="append", default=[],
+                        help="press the reset button at this virtual second (repeatable)")
+    parser.add_argument("--outage", action="append", default=[], metavar="AT:SECONDS",
+                        help="take the first sensor out of range at AT for SECONDS (repeatable)")
+    parser.add_argument("--quiet", action="store_true", help="hide firmware output")
+    args = parser.parse_args()
+
+    world, rig = build(args.threshold, sensors=args.sensors)
+    for n in world.nodes:
+        n.quiet = args.quiet
+        # main() reads TRANSPORT when it starts, after the module has loaded
+        m = n.load()
+        m.TRANSPORT = args.transport
+        m.stats.level = args.log
+    # Only the last board's sink heats up, the valve has to trip on it alone
+    scenario = [ramp(rig["boards"][-1]["probes"], 30.0, 50.0, 10.0, 30.0)]
+    if args.stats:
+        scenario.append(ask_stats(world, args.seconds))
+    for at in args.reset:
+        scenario.append(press_reset(rig["button"], at))
+    for spec in args.outage:
+        at, seconds = spec.split(":")
+        scenario.append(outage(rig["sensor"], float(at), float(seconds)))
+    # Heat from 30 C to 50 C between 10 s and 40 s
+    world.run(args.seconds, *scenario)
+
+    print("\nValve relay:")
+    for t, level in rig["relay"].changes:
+        print("  %9.3f s  %s" % (t / 1e6, "CLOSED" if level else "open"))
+    if not rig["relay"].changes:
+        print("  never switched")
+    print("Boot phases, ms since power-on:")
+    for n in world.nodes:
+        phases = [c for c in n.module.stats.counters if isinstance(c, n.module.stats.Phase)]
+        print("  %-8s %s" % (n.name, "  ".join(
+            "%s %s" % (c.name[5:], c.value if c.done else "-") for c in phases)))
+    panel = rig["panel"]
+    print("OLED: %d I2C writes, %d data bytes" % (panel.writes, panel.data_bytes))
+    print("Virtual time: %.3f s" % (clock.us / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Host stand-in for uasyncio on top of CPython's asyncio, on virtual time.
+
+VirtualLoop reports the virtual clock as its time and, instead of
+blocking in select(), jumps the clock forward to the next timer. Blocking
+driver calls (sleep_us, I2C transfers) advance the same clock, so they
+show up as event-loop stalls exactly as they would on the board.
+"""
+
+import asyncio
+import math
+import selectors
+
+from asyncio import (  # noqa: F401
+    CancelledError, Event, Lock, Task, TimeoutError, create_task, current_task,
+    gather, get_event_loop, sleep, wait_for)
+
+import board
+from vclock import clock
+
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+def wait_for_ms(aw, timeout):
+    return asyncio.wait_for(aw, timeout / 1000)
+
+
+class ThreadSafeFlag:
+    # On the board set() may be called from an IRQ; here it is just a flag
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+class StreamReader:
+    # Console input: lines typed into the node with Node.type()
+    def __init__(self, stream):
+        self._node = board.node()
+
+    async def readline(self):
+        if self._node is None:
+            await asyncio.Event().wait()  # no console outside a World
+        return await self._node.stdin.get()
+
+
+class _VirtualSelector(selectors.BaseSelector):
+    def __init__(self):
+        self._real = selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data=None):
+        return self._real.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._real.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._real.modify(fileobj, events, data)
+
+    def select(self, timeout=None):
+        events = self._real.select(0)
+        if not events and timeout:
+            clock.advance(math.ceil(timeout * 1e6))
+        return events
+
+    def close(self):
+        self._real.close()
+
+    def get_map(self):
+        return self._real.get_map()
+
+
+class VirtualLoop(asyncio.SelectorEventLoop):
+    def __init__(self):
+        super().__init__(_VirtualSelector())
+
+    def time(self):
+        return clock.us / 1e6
+
+
+def new_event_loop():
+    return VirtualLoop()
+
+
+def run(coro):
+    n = board.current
+    if n is not None:
+        # Firmware being loaded by the sim: the world starts it later
+        n.main = coro
+        return None
+    loop = VirtualLoop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
@@ -0,0 +1,42 @@
+"""
+Fixtures shared by the valve controller's checks.
+
+Puts the controller's folder on the import path and quiets its logging,
+and gives a ValveState on a simulated relay pin, the relay check and a
+clock step. Sensor addresses and deadlines are the ones the checks use.
+"""
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+VALVE_DIR = os.path.join(ROOT, "Valve Controller (RECEIVE)")
+if VALVE_DIR not in sys.path:
+    sys.path[:0] = [HERE, VALVE_DIR]
+
+import machine  # noqa: E402
+import stats  # noqa: E402
+from vclock import clock  # noqa: E402
+from valvestate import ValveState  # noqa: E402
+
+stats.level = 0  # transitions are checked, not printed
+
+STALE_MS = 6000
+FORGET_MS = 60_000
+A, B, C = b"A", b"B", b"C"
+
+
+def expect(state, name, relay):
+    assert state.state == name, "state %s, expected %s" % (state.state, name)
+    assert state.pin.value() == relay, "relay %d in %s" % (state.pin.value(), name)
+
+
+def valve(failsafe_level=None):
+    # ValveState on the relay pin, and its trips counter
+    trips = stats.Counter("check_trips")
+    return ValveState(machine.Pin(4, machine.Pin.OUT), failsafe_level, trips), trips
+
+
+def wait(ms):
+    clock.advance(ms * 1000)
@@ -0,0 +1,52 @@
+"""
+Virtual microsecond clock shared by the simulated peripherals.
+
+MicroPython's time module has sleep_us/ticks_us and friends that CPython
+lacks. install() adds them to CPython's time module backed by this clock,
+so driver code that bit-bangs with sleep_us runs instantly on the host and
+the elapsed "bus time" can still be read back.
+"""
+
+import time
+
+
+class Clock:
+    def __init__(self):
+        self.us = 0
+
+    def advance(self, us):
+        if us > 0:
+            self.us += int(us)
+
+    def sleep_us(self, us):
+        self.advance(us)
+
+    def sleep_ms(self, ms):
+        self.advance(ms * 1000)
+
+    def ticks_us(self):
+        return self.us
+
+    def ticks_ms(self):
+        return self.us // 1000
+
+
+clock = Clock()
+
+
+def ticks_diff(a, b):
+    return a - b
+
+
+def ticks_add(a, b):
+    return a + b
+
+
+def install():
+    time.sleep_us = clock.sleep_us
+    time.sleep_ms = clock.sleep_ms
+    time.ticks_us = clock.ticks_us
+    time.ticks_ms = clock.ticks_ms
+    time.ticks_cpu = clock.ticks_us
+    time.ticks_diff = ticks_diff
+    time.ticks_add = ticks_add
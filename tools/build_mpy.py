@@ -0,0 +1,81 @@
+"""
+Build deployable images of both boards with precompiled modules.
+
+Every module but main.py is cross-compiled to .mpy, so the board loads
+bytecode instead of parsing and compiling source on each boot; main.py
+stays source, since it's the entry point. Each board's files land in
+dist/<board>/, ready to copy to the board's filesystem root:
+
+    python tools/build_mpy.py [--arch xtensawin] [--manifest]
+    mpremote fs cp -r "dist/Temperature Sensor (TRANSMIT)/." :
+
+Remove any old .py copy of a compiled module from the board: MicroPython
+imports the .py before the .mpy. --manifest also writes a manifest.py
+listing the same modules, for freezing them into a firmware build
+(FROZEN_MANIFEST), which boots faster still.
+
+Needs mpy-cross on the PATH or the mpy-cross pip package, of the same
+bytecode version as the firmware on the boards.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BOARDS = ("Temperature Sensor (TRANSMIT)", "Valve Controller (RECEIVE)")
+ENTRY = "main.py"
+HOST_ONLY = ("read_serial.py",)  # runs on the PC, not the board
+ARCH = "rv32imc"  # ESP32-C6, both boards; xtensawin for an ESP32 or -S3
+
+
+def mpy_cross():
+    exe = shutil.which("mpy-cross")
+    if exe:
+        return [exe]
+    try:
+        import mpy_cross  # noqa: F401
+    except ImportError:
+        sys.exit("mpy-cross not found: install it with `pip install mpy-cross`")
+    return [sys.executable, "-m", "mpy_cross"]
+
+
+def build(board, out, cross, arch, manifest):
+    src = os.path.join(ROOT, board)
+    dst = os.path.join(out, board)
+    shutil.rmtree(dst, ignore_errors=True)
+    os.makedirs(dst)
+    modules = sorted(f for f in os.listdir(src)
+                     if f.endswith(".py") and f != ENTRY and f not in HOST_ONLY)
+    for name in modules:
+        target = os.path.join(dst, name[:-3] + ".mpy")
+        # No -O: it strips asserts, and the 1-Wire CRC checks are asserts
+        cmd = cross + ["-march=" + arch, "-o", target, name]
+        # Compiled from inside the folder so tracebacks name the bare file
+        subprocess.run(cmd, cwd=src, check=True)
+    shutil.copy(os.path.join(src, ENTRY), dst)
+    if manifest:
+        with open(os.path.join(dst, "manifest.py"), "w") as f:
+            for name in modules:
+                f.write("module(%r, base_path=%r)\n" % (name, src))
+    print("%s: %d modules compiled, %s kept as source" % (board, len(modules), ENTRY))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default=os.path.join(ROOT, "dist"))
+    parser.add_argument("--arch", default=ARCH,
+                        help="native code target for @micropython.viper/native functions")
+    parser.add_argument("--manifest", action="store_true", help="also write a freeze manifest")
+    args = parser.parse_args()
+
+    cross = mpy_cross()
+    for board in BOARDS:
+        build(board, args.out, cross, args.arch, args.manifest)
+
+
+if __name__ == "__main__":
+    main()